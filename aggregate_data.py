@@ -1,41 +1,93 @@
 from pathlib import Path
 import duckdb
 
-HOURLY_GLOB = "data/processed/pageviews_hourly/dt=*/hour=*/part-*.parquet"
+from title_dictionary import title_dict_source, update_title_dictionary
+from compact_hourly import hourly_files_by_dt
+from partition_manifest import (
+    load_manifest,
+    save_manifest,
+    fingerprint_by_dt,
+    changed_partitions,
+    drop_partitions,
+    sql_file_list,
+)
+
 DAILY_OUT_DIR = Path("data/aggregates/pageviews_daily")
 DAILY_OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-def aggregate_data():
+MANIFEST_NAME = "aggregate_daily_v2"  # v2: title_id instead of title
+
+def daily_sql(source: str) -> str:
+    """SELECT summing hourly rows from `source` into (dt, project, title_id) totals."""
+    return f"""
+        SELECT
+            h.dt,
+            h.project,
+            d.title_id,
+            SUM(h.views) AS views
+        FROM {source} h
+        JOIN {title_dict_source()} d ON d.title = h.title
+        GROUP BY h.dt, h.project, d.title_id
+    """
+
+def aggregate_data(incremental: bool = False):
+    """Aggregate hourly parquet into daily partitions.
+
+    With incremental=True only the dt partitions whose hourly files changed
+    since the last run (per the manifest in partition_manifest.STATE_DIR)
+    are re-read and rewritten; the rest of pageviews_daily is left alone.
+    """
     print("Starting daily aggregation...")
-    print(f"Reading hourly files via glob:\n  {HOURLY_GLOB}")
+    print("Reading hourly files (compacted days + per-hour files)")
     print(f"Writing output to:\n  {DAILY_OUT_DIR.resolve()}")
 
+    update_title_dictionary()
+
+    hourly_files = hourly_files_by_dt()
+    current = fingerprint_by_dt(hourly_files)
+
+    if incremental:
+        changed, removed = changed_partitions(current, load_manifest(MANIFEST_NAME))
+        drop_partitions(DAILY_OUT_DIR, removed)
+        if not changed:
+            save_manifest(MANIFEST_NAME, current)
+            print("Daily aggregates are up to date; nothing to do.")
+            return
+        print(f"Recomputing {len(changed)} changed day(s): {', '.join(changed)}")
+        source = sql_file_list([p for dt in changed for p in hourly_files[dt]])
+    else:
+        source = sql_file_list([p for files in hourly_files.values() for p in files])
+
+    if not current:
+        raise RuntimeError("No hourly files found. Run process_data first.")
+
     con = duckdb.connect()
 
     row_count = con.execute(
-        f"SELECT COUNT(*) FROM read_parquet('{HOURLY_GLOB}')"
+        f"SELECT COUNT(*) FROM read_parquet({source}, hive_partitioning = false)"
     ).fetchone()[0]
 
     print(f"Total rows found in hourly parquet: {row_count:,}")
-    if row_count == 0:
+    if row_count == 0 and not incremental:
         con.close()
-        raise RuntimeError("No hourly rows found. Check HOURLY_GLOB.")
+        raise RuntimeError("No hourly rows found. Run process_data first.")
+
+    if incremental:
+        drop_partitions(DAILY_OUT_DIR, changed)
+        write_mode = "OVERWRITE_OR_IGNORE 1"
+    else:
+        write_mode = "OVERWRITE 1"
 
     con.execute(f"""
         COPY (
-            SELECT
-                dt,
-                project,
-                title,
-                SUM(views) AS views
-            FROM read_parquet('{HOURLY_GLOB}')
-            GROUP BY dt, project, title
+            {daily_sql(f"read_parquet({source}, hive_partitioning = false)")}
         )
         TO '{DAILY_OUT_DIR.as_posix()}'
-        (FORMAT PARQUET, PARTITION_BY (dt), COMPRESSION ZSTD, OVERWRITE 1);
+        (FORMAT PARQUET, PARTITION_BY (dt), COMPRESSION ZSTD, {write_mode});
     """)
 
     con.close()
+    save_manifest(MANIFEST_NAME, current)
 
     out_files = list(DAILY_OUT_DIR.rglob("*.parquet"))
     print(f"Done. Parquet files written: {len(out_files)}")
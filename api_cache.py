@@ -0,0 +1,147 @@
+import json
+import time
+import sqlite3
+import threading
+import functools
+from pathlib import Path
+
+# Persistent cache for the Wikidata / enwiki lookups in canonicalize_topic.
+# Results live in one SQLite file (WAL mode), so every dashboard process and
+# restart shares them. Entries expire after CACHE_TTL_S; once the table holds
+# more than CACHE_MAX_ROWS the oldest entries are evicted.
+#
+# With OFFLINE = True nothing is fetched: cached results are served even if
+# expired, and a miss raises OfflineCacheMiss.
+
+CACHE_PATH = Path("data/state/api_cache.sqlite")
+CACHE_TTL_S = 7 * 24 * 3600
+CACHE_MAX_ROWS = 200_000
+EVICT_EVERY = 500  # writes between eviction passes
+
+OFFLINE = False
+
+
+class OfflineCacheMiss(RuntimeError):
+    pass
+
+
+_local = threading.local()
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    # sqlite3 connections can't be shared across threads; keep one per thread
+    con = getattr(_local, "con", None)
+    if con is None:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(CACHE_PATH, timeout=30)
+        con.execute("PRAGMA journal_mode = WAL")
+        con.execute("PRAGMA synchronous = NORMAL")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS api_cache (
+                namespace  TEXT NOT NULL,
+                key        TEXT NOT NULL,
+                value      TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        con.execute("CREATE INDEX IF NOT EXISTS api_cache_age ON api_cache (fetched_at)")
+        _local.con = con
+    return con
+
+
+def cache_key(args: tuple, kwargs: dict) -> str:
+    return json.dumps([args, sorted(kwargs.items())], ensure_ascii=False)
+
+
+def cache_get(namespace: str, key: str, ttl_s: float = CACHE_TTL_S) -> tuple[bool, object]:
+    """(hit, value); expired entries only count as hits when OFFLINE."""
+    row = _connect().execute(
+        "SELECT value, fetched_at FROM api_cache WHERE namespace = ? AND key = ?",
+        (namespace, key),
+    ).fetchone()
+    if row is None:
+        return False, None
+    value, fetched_at = row
+    if not OFFLINE and time.time() - fetched_at > ttl_s:
+        return False, None
+    return True, json.loads(value)
+
+
+def cache_put(namespace: str, key: str, value) -> None:
+    global _writes
+    con = _connect()
+    with con:
+        con.execute(
+            "INSERT OR REPLACE INTO api_cache VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), time.time()),
+        )
+    with _writes_lock:
+        _writes += 1
+        due = _writes % EVICT_EVERY == 0
+    if due:
+        evict()
+
+
+def evict(ttl_s: float = CACHE_TTL_S, max_rows: int = CACHE_MAX_ROWS) -> int:
+    """Drop expired entries, then the oldest ones beyond max_rows."""
+    con = _connect()
+    with con:
+        n = con.execute(
+            "DELETE FROM api_cache WHERE fetched_at < ?", (time.time() - ttl_s,)
+        ).rowcount
+        n += con.execute(
+            """
+            DELETE FROM api_cache WHERE rowid IN (
+                SELECT rowid FROM api_cache
+                ORDER BY fetched_at DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (max_rows,),
+        ).rowcount
+    return n
+
+
+def persistent_cache(namespace: str, ttl_s: float = CACHE_TTL_S):
+    """Cache a function's JSON-serializable result by its arguments."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = cache_key(args, kwargs)
+            hit, value = cache_get(namespace, key, ttl_s)
+            if hit:
+                return value
+            if OFFLINE:
+                raise OfflineCacheMiss(f"{namespace}{tuple(args)} is not cached (offline mode)")
+            value = fn(*args, **kwargs)
+            cache_put(namespace, key, value)
+            return value
+        return wrapper
+    return decorator
+
+
+def cache_many(namespace: str, items: list, fetch_many, ttl_s: float = CACHE_TTL_S) -> dict:
+    """{item: value} for many single-argument lookups at once.
+
+    Cached items are served from the table; `fetch_many(missing)` must
+    return {item: value} for the rest. Keys match persistent_cache on a
+    one-argument function, so batched and single lookups share entries.
+    """
+    out, missing = {}, []
+    for item in dict.fromkeys(items):
+        hit, value = cache_get(namespace, cache_key((item,), {}), ttl_s)
+        if hit:
+            out[item] = value
+        else:
+            missing.append(item)
+
+    if missing:
+        if OFFLINE:
+            raise OfflineCacheMiss(f"{namespace}: {len(missing)} item(s) not cached (offline mode)")
+        for item, value in fetch_many(missing).items():
+            cache_put(namespace, cache_key((item,), {}), value)
+            out[item] = value
+    return out
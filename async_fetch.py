@@ -0,0 +1,167 @@
+import time
+import random
+import asyncio
+import hashlib
+
+try:
+    import aiohttp  # optional, only needed for this engine
+    _HAS_AIOHTTP = True
+except ImportError:
+    _HAS_AIOHTTP = False
+
+from dump_integrity import ChecksumMismatch, VerifiedManifest, md5_file, quarantine
+from request_data import CHUNK_SIZE, MAX_RETRIES, RETRY_STATUS, THROTTLE_PAUSE_S, raw_path, _retry_after
+
+# asyncio alternative to the thread pool in request_data.fetch_data. One
+# event loop keeps up to ASYNC_CONCURRENCY transfers in flight; each streams
+# to its .part file in CHUNK_SIZE pieces, and aiohttp stops reading the
+# socket while its buffer is full, so memory stays bounded. File writes and
+# md5 updates run in a worker thread so they never stall the event loop.
+# Resume, checksum and quarantine rules are the same as
+# request_data.download_one.
+
+ASYNC_CONCURRENCY = 32
+PROGRESS_EVERY_S = 10
+
+
+class _Transfers:
+    """Aggregate byte/file counters and the pause shared after a 429."""
+
+    def __init__(self, total_files: int):
+        self.total_files = total_files
+        self.files = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.paused_until = 0.0
+
+    def add(self, n: int):
+        self.bytes += n
+        now = time.monotonic()
+        if now - self.last_report >= PROGRESS_EVERY_S:
+            self.last_report = now
+            self.report()
+
+    def report(self, final: bool = False):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        label = "Fetched" if final else "Progress:"
+        print(
+            f"{label} {self.files}/{self.total_files} file(s), "
+            f"{self.bytes / 1e6:,.1f} MB in {elapsed:,.1f}s "
+            f"({self.bytes / 1e6 / elapsed:,.2f} MB/s)"
+        )
+
+    async def wait_if_paused(self):
+        wait = self.paused_until - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def _write_chunk(f, h, chunk: bytes):
+    f.write(chunk)
+    h.update(chunk)
+
+
+async def _download(session, sem, transfers: _Transfers, verified: VerifiedManifest, url: str, md5):
+    filename = url.split("/")[-1]
+    out_path = raw_path(filename)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(out_path.suffix + ".part")
+
+    if await asyncio.to_thread(verified.check, out_path, md5):
+        transfers.files += 1
+        return f"SKIP {filename}"
+
+    for attempt in range(1, MAX_RETRIES + 1):
+        offset = tmp_path.stat().st_size if tmp_path.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        try:
+            async with sem:
+                await transfers.wait_if_paused()
+                async with session.get(url, headers=headers) as r:
+                    if r.status in RETRY_STATUS:
+                        if r.status == 429:
+                            # hold back every transfer, not just this one
+                            retry_after = _retry_after(r)
+                            transfers.pause(THROTTLE_PAUSE_S if retry_after is None else retry_after)
+                        raise aiohttp.ClientResponseError(
+                            r.request_info, r.history, status=r.status, message="transient error"
+                        )
+
+                    if r.status == 416:
+                        # .part is longer than the published file; start over
+                        tmp_path.unlink(missing_ok=True)
+                        continue
+
+                    r.raise_for_status()
+
+                    resumed = r.status == 206
+                    if resumed and not r.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+                        tmp_path.unlink(missing_ok=True)
+                        continue
+
+                    h = await asyncio.to_thread(md5_file, tmp_path) if resumed else hashlib.md5()
+                    with open(tmp_path, "ab" if resumed else "wb") as f:
+                        async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                            await asyncio.to_thread(_write_chunk, f, h, chunk)
+                            transfers.add(len(chunk))
+
+            if md5 is not None and h.hexdigest() != md5:
+                raise ChecksumMismatch(f"{filename}: expected md5 {md5}, got {h.hexdigest()}")
+
+            tmp_path.replace(out_path)
+            if md5 is not None:
+                verified.record(out_path, md5)
+            transfers.files += 1
+            return f"DONE {filename}"
+
+        except ChecksumMismatch as e:
+            print(f"{e}; quarantined: {quarantine(tmp_path)}")
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = getattr(e, "status", None)
+            if isinstance(e, aiohttp.ClientResponseError) and status not in RETRY_STATUS:
+                raise
+            if status == 429:
+                # the shared pause already spaces the retries out
+                await asyncio.sleep(random.random())
+            else:
+                await asyncio.sleep(min(60, 2 ** (attempt - 1)) + random.random())
+
+    raise RuntimeError(f"FAILED after {MAX_RETRIES} retries: {filename}")
+
+
+async def _fetch_all(planned, verified: VerifiedManifest, concurrency: int):
+    transfers = _Transfers(len(planned))
+    sem = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=60, sock_read=120)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = [
+            asyncio.create_task(_download(session, sem, transfers, verified, url, md5))
+            for url, md5 in planned
+        ]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                print(await fut)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    transfers.report(final=True)
+
+
+def fetch_async(planned, verified: VerifiedManifest, concurrency: int = ASYNC_CONCURRENCY):
+    """Download `planned` [(url, md5)] (see request_data.plan_hours) on one event loop."""
+    if not _HAS_AIOHTTP:
+        raise RuntimeError(
+            "The async fetch engine needs aiohttp, which is not installed "
+            "(pip install aiohttp), or use FETCH_ENGINE = 'threads'"
+        )
+    asyncio.run(_fetch_all(planned, verified, concurrency))
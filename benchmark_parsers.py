@@ -0,0 +1,71 @@
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+import duckdb
+
+from decompress import open_dump
+from process_data import IN_DIR, PARSERS, parse_one_gz_to_parquet
+
+# Compare the parser engines in process_data (and the decompression
+# options in decompress.py) on one (or a few) raw dumps.
+#
+# usage: python benchmark_parsers.py [path/to/pageviews-*.gz ...]
+# (defaults to the first file found in process_data.IN_DIR)
+
+def bench_file(gz_path: Path, repeat: int = 1) -> dict[str, tuple[float, int, int]]:
+    """Return {engine: (best_seconds, rows, total_views)} for one dump."""
+    results = {}
+    for engine in PARSERS:
+        best = float("inf")
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as tmp:
+                t0 = time.perf_counter()
+                parse_one_gz_to_parquet(gz_path, engine=engine, out_root=Path(tmp))
+                best = min(best, time.perf_counter() - t0)
+
+                rows, views = duckdb.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(views), 0) FROM read_parquet('{Path(tmp).as_posix()}/**/*.parquet')"
+                ).fetchone()
+        results[engine] = (best, rows, views)
+    return results
+
+def bench_decompressors(gz_path: Path) -> dict[str, float]:
+    """Return {decompressor: seconds} to stream the whole dump through open_dump."""
+    results = {}
+    for mode in ("stdlib", "thread", "gzip", "pigz"):
+        try:
+            t0 = time.perf_counter()
+            with open_dump(gz_path, mode) as f:
+                while f.read(1024 * 1024):
+                    pass
+            results[mode] = time.perf_counter() - t0
+        except RuntimeError:
+            continue  # external tool not installed
+    return results
+
+def main():
+    paths = [Path(p) for p in sys.argv[1:]] or sorted(IN_DIR.glob("*/*.gz"))[:1]
+    if not paths:
+        raise RuntimeError(f"No .gz files given and none found in {IN_DIR}")
+
+    for gz in paths:
+        print(f"== {gz.name} ({gz.stat().st_size / 1e6:.1f} MB compressed)")
+        results = bench_file(gz)
+        baseline = results["lines"][0]
+        for engine, (secs, rows, views) in results.items():
+            print(
+                f"  {engine:<6} {secs:8.2f}s  {rows:>12,} rows  {views:>14,} views"
+                f"  x{baseline / secs:.2f} vs lines"
+            )
+
+        counts = {(rows, views) for _, rows, views in results.values()}
+        if len(counts) > 1:
+            print("  WARNING: engines disagree on row count / total views")
+
+        for mode, secs in bench_decompressors(gz).items():
+            print(f"  decompress {mode:<6} {secs:8.2f}s")
+
+if __name__ == "__main__":
+    main()
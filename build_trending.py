@@ -1,15 +1,113 @@
 from pathlib import Path
 import duckdb
 
+from title_dictionary import title_dict_source
+from data_version import publish_data_version
+
 FEATURES_GLOB = "data/aggregates/pageviews_daily_features/dt=*/data_*.parquet"
 
 TREND_OUT_DIR = Path("data/aggregates/pageviews_daily_trending")
 TREND_OUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# small per-date leaderboards the dashboard reads instead of sorting the
+# whole trending dataset on every rerun
+TOP_OUT_FILE = Path("data/aggregates/pageviews_trending_top.parquet")
+TOP_K = 50
+ALL_PROJECTS = "all"  # leaderboard "project" holding the cross-project ranking
+
 MIN_VIEWS_TODAY = 0
 MIN_MA7 = 100
 MIN_PREV = 50
 
+def trending_sql(source: str) -> str:
+    """SELECT scoring and thresholding feature rows from `source`.
+
+    Titles are looked up from the dictionary here, since trending is the
+    dataset the dashboard displays directly.
+    """
+    return f"""
+        SELECT
+            f.*,
+            d.title,
+            (LN(views + 1) * 0.5) +
+            (LN(GREATEST(delta, 0) + 1) * 1.0) +
+            COALESCE(z7, 0) AS up_score,
+
+            (LN(views + 1) * 0.5) +
+            (LN(GREATEST(-delta, 0) + 1) * 1.0) +
+            COALESCE(z7, 0) AS down_score,
+
+            (LN(views + 1) * 0.5) +
+            (SIGN(delta) * LN(ABS(delta) + 1) * 1.0) +
+            COALESCE(z7, 0) AS trend_score
+        FROM {source} f
+        JOIN {title_dict_source()} d ON d.title_id = f.title_id
+        WHERE
+            title NOT LIKE '%:%'
+            AND title IS NOT NULL
+            AND title <> '-'
+            AND title <> ''
+            AND views >= {MIN_VIEWS_TODAY}
+            AND ma7 >= {MIN_MA7}
+            AND (views_prev IS NULL OR views_prev >= {MIN_PREV})
+    """
+
+def leaderboard_sql(source: str) -> str:
+    """Top TOP_K rows per (dt, project, board) for the up / down / overall boards.
+
+    Each date is ranked per project and once more across all projects
+    (project = ALL_PROJECTS). The down board only holds rows with delta < 0.
+    """
+    cols = "dt, title_id, title, views, delta, up_score, down_score, trend_score"
+    return f"""
+        WITH scoped AS (
+            SELECT project, {cols} FROM {source}
+            UNION ALL
+            SELECT '{ALL_PROJECTS}' AS project, {cols} FROM {source}
+        )
+        SELECT 'up' AS board, *,
+            ROW_NUMBER() OVER (PARTITION BY dt, project ORDER BY up_score DESC, title) AS rank
+        FROM scoped
+        QUALIFY rank <= {TOP_K}
+
+        UNION ALL
+
+        SELECT 'down' AS board, *,
+            ROW_NUMBER() OVER (PARTITION BY dt, project ORDER BY down_score DESC, title) AS rank
+        FROM scoped
+        WHERE delta < 0
+        QUALIFY rank <= {TOP_K}
+
+        UNION ALL
+
+        SELECT 'overall' AS board, *,
+            ROW_NUMBER() OVER (PARTITION BY dt, project ORDER BY trend_score DESC, title) AS rank
+        FROM scoped
+        QUALIFY rank <= {TOP_K}
+
+        ORDER BY dt, project, board, rank
+    """
+
+def write_trending(con: duckdb.DuckDBPyConnection, features_source: str) -> None:
+    """Materialize trending rows once, then write the dataset and its leaderboard."""
+    con.execute(f"CREATE OR REPLACE TEMP TABLE trending AS {trending_sql(features_source)}")
+
+    con.execute(f"""
+        COPY trending
+        TO '{TREND_OUT_DIR.as_posix()}'
+        (FORMAT PARQUET, PARTITION_BY (dt), COMPRESSION ZSTD, OVERWRITE 1);
+    """)
+
+    tmp_file = TOP_OUT_FILE.with_suffix(".parquet.part")
+    con.execute(f"""
+        COPY ({leaderboard_sql("trending")})
+        TO '{tmp_file.as_posix()}'
+        (FORMAT PARQUET, COMPRESSION ZSTD);
+    """)
+    tmp_file.replace(TOP_OUT_FILE)
+
+    publish_data_version()
+
 def build_trends():
     con = duckdb.connect()
 
@@ -20,34 +118,8 @@ def build_trends():
         con.close()
         raise RuntimeError("No feature data found. Run build_features first.")
 
-    con.execute(f"""
-        COPY (
-            SELECT
-                *,
-                (LN(views + 1) * 0.5) +
-                (LN(GREATEST(delta, 0) + 1) * 1.0) +
-                COALESCE(z7, 0) AS up_score,
-
-                (LN(views + 1) * 0.5) +
-                (LN(GREATEST(-delta, 0) + 1) * 1.0) +
-                COALESCE(z7, 0) AS down_score,
-
-                (LN(views + 1) * 0.5) +
-                (SIGN(delta) * LN(ABS(delta) + 1) * 1.0) +
-                COALESCE(z7, 0) AS trend_score
-            FROM read_parquet('{FEATURES_GLOB}')
-            WHERE
-                title NOT LIKE '%:%'
-                AND title IS NOT NULL
-                AND title <> '-'
-                AND title <> ''
-                AND views >= {MIN_VIEWS_TODAY}
-                AND ma7 >= {MIN_MA7}
-                AND (views_prev IS NULL OR views_prev >= {MIN_PREV})
-        )
-        TO '{TREND_OUT_DIR.as_posix()}'
-        (FORMAT PARQUET, PARTITION_BY (dt), COMPRESSION ZSTD, OVERWRITE 1);
-    """)
+    write_trending(con, f"read_parquet('{FEATURES_GLOB}')")
 
     con.close()
     print("Done. Trending dataset written to:", TREND_OUT_DIR)
+    print("Leaderboards written to:", TOP_OUT_FILE)
@@ -1,5 +1,8 @@
 import requests
-from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+
+from api_cache import persistent_cache, cache_many
 
 WIKIDATA_API = "https://www.wikidata.org/w/api.php"
 ENWIKI_API = "https://en.wikipedia.org/w/api.php"
@@ -7,7 +10,13 @@ ENWIKI_API = "https://en.wikipedia.org/w/api.php"
 # IMPORTANT: Wikimedia APIs expect a descriptive User-Agent.
 USER_AGENT = "UPB-IABD-WikiTrendsDashboard/1.0 (contact: student-project)"
 
+BATCH_SIZE = 50  # most ids / titles one request may carry (non-bot limit)
+MAX_CONCURRENT_REQUESTS = 8
+REDIRECT_HARD_CAP = 5000
+
 _session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=MAX_CONCURRENT_REQUESTS))
+_session.mount("http://", HTTPAdapter(pool_maxsize=MAX_CONCURRENT_REQUESTS))
 _session.headers.update({
     "User-Agent": USER_AGENT,
     "Accept": "application/json",
@@ -19,7 +28,7 @@ def _get(url: str, params: dict):
     r.raise_for_status()
     return r
 
-@lru_cache(maxsize=2048)
+@persistent_cache("wikidata_search_qid")
 def wikidata_search_qid(query: str, limit: int = 5) -> list[dict]:
     params = {
         "action": "wbsearchentities",
@@ -35,61 +44,123 @@ def wikidata_search_qid(query: str, limit: int = 5) -> list[dict]:
         for item in data.get("search", [])
     ]
 
-@lru_cache(maxsize=2048)
 def wikidata_get_enwiki_title(qid: str) -> str | None:
+    return wikidata_get_enwiki_titles([qid])[qid]
+
+def enwiki_get_redirect_titles(canonical_title: str) -> list[str]:
+    return enwiki_get_redirects_many([canonical_title])[canonical_title]
+
+def normalize_to_dump_title(title: str) -> str:
+    return title.replace(" ", "_")
+
+# -----------------------------
+# Batched / concurrent lookups
+# -----------------------------
+def _chunks(items: list, n: int) -> list[list]:
+    return [items[i:i + n] for i in range(0, len(items), n)]
+
+def _pool_map(fn, items: list) -> list:
+    """fn over items on up to MAX_CONCURRENT_REQUESTS threads, in order."""
+    if len(items) <= 1:
+        return [fn(x) for x in items]
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(items))) as pool:
+        return list(pool.map(fn, items))
+
+def _fetch_enwiki_titles(qids: list[str]) -> dict[str, str | None]:
     # Use wbgetentities (API) to avoid hitting Special:EntityData which sometimes triggers stricter rules
     params = {
         "action": "wbgetentities",
-        "ids": qid,
+        "ids": "|".join(qids),
         "props": "sitelinks",
         "sitefilter": "enwiki",
         "format": "json",
     }
-    r = _get(WIKIDATA_API, params=params)
-    data = r.json()
-    ent = data.get("entities", {}).get(qid, {})
-    sitelinks = ent.get("sitelinks", {})
-    enwiki = sitelinks.get("enwiki")
-    return enwiki.get("title") if enwiki else None
-
-@lru_cache(maxsize=2048)
-def enwiki_get_redirect_titles(canonical_title: str, hard_cap: int = 5000) -> list[str]:
-    redirects = []
+    entities = _get(WIKIDATA_API, params=params).json().get("entities", {})
+    out = {}
+    for qid in qids:
+        enwiki = entities.get(qid, {}).get("sitelinks", {}).get("enwiki")
+        out[qid] = enwiki.get("title") if enwiki else None
+    return out
+
+def wikidata_get_enwiki_titles(qids: list[str]) -> dict[str, str | None]:
+    """Batched wikidata_get_enwiki_title: BATCH_SIZE ids per wbgetentities call."""
+    def fetch(missing):
+        out = {}
+        for part in _pool_map(_fetch_enwiki_titles, _chunks(missing, BATCH_SIZE)):
+            out.update(part)
+        return out
+
+    return cache_many("wikidata_get_enwiki_title", qids, fetch)
+
+def _fetch_redirects(titles: list[str]) -> dict[str, list[str]]:
+    """Redirects for up to BATCH_SIZE titles, following rdcontinue."""
+    redirects = {t: [] for t in titles}
     cont = None
 
     while True:
         params = {
             "action": "query",
             "format": "json",
-            "titles": canonical_title,
+            "titles": "|".join(titles),
             "prop": "redirects",
             "rdlimit": "max",
         }
         if cont:
             params["rdcontinue"] = cont
 
-        r = _get(ENWIKI_API, params=params)
-        data = r.json()
+        data = _get(ENWIKI_API, params=params).json()
+        query = data.get("query", {})
 
-        pages = data.get("query", {}).get("pages", {})
-        for _, page in pages.items():
-            for rd in page.get("redirects", []):
-                t = rd.get("title")
-                if t:
-                    redirects.append(t)
+        # the API answers with normalized titles ("foo bar" -> "Foo bar");
+        # several inputs may normalize to the same page
+        original = {}
+        for n in query.get("normalized", []):
+            original.setdefault(n["to"], []).append(n["from"])
+        for page in query.get("pages", {}).values():
+            page_title = page.get("title")
+            found = [rd["title"] for rd in page.get("redirects", []) if rd.get("title")]
+            for title in dict.fromkeys([page_title, *original.get(page_title, [])]):
+                if title in redirects and len(redirects[title]) < REDIRECT_HARD_CAP:
+                    redirects[title].extend(found)
 
         cont = data.get("continue", {}).get("rdcontinue")
-        if not cont or len(redirects) >= hard_cap:
+        if not cont or all(len(r) >= REDIRECT_HARD_CAP for r in redirects.values()):
             break
 
-    # Deduplicate preserve order
-    seen = set()
-    out = []
-    for t in redirects:
-        if t not in seen:
-            seen.add(t)
-            out.append(t)
-    return out
+    return {t: list(dict.fromkeys(r)) for t, r in redirects.items()}
 
-def normalize_to_dump_title(title: str) -> str:
-    return title.replace(" ", "_")
+def enwiki_get_redirects_many(titles: list[str]) -> dict[str, list[str]]:
+    """Batched enwiki_get_redirect_titles: BATCH_SIZE titles per query, batches in parallel."""
+    def fetch(missing):
+        out = {}
+        for part in _pool_map(_fetch_redirects, _chunks(missing, BATCH_SIZE)):
+            out.update(part)
+        return out
+
+    return cache_many("enwiki_get_redirect_titles", titles, fetch)
+
+def resolve_topics(queries: list[str], limit: int = 5, redirects: bool = True) -> dict[str, dict]:
+    """Resolve many topics in one pass.
+
+    Searches (one per query; the API has no multi-search) run concurrently,
+    then sitelinks and redirects are fetched in batches for all topics at
+    once. Returns {query: {"qid", "canonical_title", "redirects"}}, with
+    None / [] where a step found nothing. With redirects=False the redirect
+    lookup is skipped (callers with a local redirect map).
+    """
+    queries = list(dict.fromkeys(queries))
+    searches = _pool_map(lambda q: wikidata_search_qid(q, limit=limit), queries)
+    qids = {q: (found[0]["qid"] if found else None) for q, found in zip(queries, searches)}
+
+    titles = wikidata_get_enwiki_titles([qid for qid in qids.values() if qid])
+    found = enwiki_get_redirects_many([t for t in titles.values() if t]) if redirects else {}
+
+    out = {}
+    for q in queries:
+        canonical = titles.get(qids[q]) if qids[q] else None
+        out[q] = {
+            "qid": qids[q],
+            "canonical_title": canonical,
+            "redirects": found.get(canonical, []) if canonical else [],
+        }
+    return out
@@ -0,0 +1,132 @@
+import time
+from pathlib import Path
+import duckdb
+
+from title_dictionary import title_dict_source
+from compact_hourly import hourly_file_list
+from partition_manifest import sql_file_list
+from title_search import build_title_search
+from redirect_map import REDIRECT_MAP_FILE, CANONICAL_DAILY_DIR
+from create_features import DAILY_GLOB
+
+# Persistent DuckDB catalog for the dashboard. Small, hot datasets are copied
+# in as native tables (with statistics); the large ones are views over an
+# explicit file list resolved at build time, so queries don't re-expand
+# globs. Every build writes a fresh catalog-<stamp>.duckdb and then points
+# CURRENT at it, so a dashboard holding the previous file open is never
+# disturbed (and nothing is replaced underneath an open file on Windows).
+
+CATALOG_DIR = Path("data/catalog")
+CURRENT_FILE = CATALOG_DIR / "CURRENT"
+
+TREND_GLOB = "data/aggregates/pageviews_daily_trending/dt=*/data_*.parquet"
+TOP_FILE = Path("data/aggregates/pageviews_trending_top.parquet")
+DAILY_BY_TITLE_GLOB = "data/aggregates/pageviews_daily_by_title/month=*/data_*.parquet"
+HOURLY_BY_TITLE_GLOB = "data/aggregates/pageviews_hourly_by_title/dt=*/data_*.parquet"
+
+
+def _file_list(pattern: str) -> str:
+    files = sorted(Path(".").glob(pattern))
+    if not files:
+        raise RuntimeError(f"No files match {pattern}. Run the pipeline first.")
+    return sql_file_list(files)
+
+
+def current_catalog() -> Path | None:
+    """Path of the catalog the pipeline published last, if any."""
+    if not CURRENT_FILE.exists():
+        return None
+    path = CATALOG_DIR / CURRENT_FILE.read_text(encoding="utf-8").strip()
+    return path if path.exists() else None
+
+
+def connect_catalog(path: Path | None = None) -> duckdb.DuckDBPyConnection:
+    """Read-only connection to `path` (default: the current catalog)."""
+    path = path or current_catalog()
+    if path is None:
+        raise RuntimeError("No DuckDB catalog found. Run build_catalog() first.")
+    con = duckdb.connect(path.as_posix(), read_only=True)
+    # keep parquet footers in memory across queries on this connection
+    con.execute("SET enable_object_cache = true")
+    return con
+
+
+def build_catalog():
+    CATALOG_DIR.mkdir(parents=True, exist_ok=True)
+    name = f"catalog-{time.time_ns()}.duckdb"
+    path = CATALOG_DIR / name
+
+    con = duckdb.connect(path.as_posix())
+
+    hourly_files = hourly_file_list()
+    if not hourly_files:
+        raise RuntimeError("No hourly files found. Run the pipeline first.")
+    con.execute(f"""
+        CREATE VIEW pageviews_hourly AS
+        SELECT * FROM read_parquet({sql_file_list(hourly_files)}, hive_partitioning = false)
+    """)
+    con.execute(f"""
+        CREATE VIEW pageviews_daily AS
+        SELECT * FROM read_parquet({_file_list(DAILY_GLOB)})
+    """)
+
+    # title-clustered copies for single-title lookups (see title_clustered.py)
+    con.execute(f"""
+        CREATE VIEW pageviews_daily_by_title AS
+        SELECT * FROM read_parquet({_file_list(DAILY_BY_TITLE_GLOB)})
+    """)
+    con.execute(f"""
+        CREATE VIEW pageviews_hourly_by_title AS
+        SELECT * FROM read_parquet({_file_list(HOURLY_BY_TITLE_GLOB)})
+    """)
+
+    con.execute(f"""
+        CREATE TABLE title_dict AS
+        SELECT * FROM {title_dict_source()}
+        ORDER BY title_id
+    """)
+    con.execute(f"""
+        CREATE TABLE pageviews_trending AS
+        SELECT * FROM read_parquet({_file_list(TREND_GLOB)})
+        ORDER BY dt
+    """)
+    con.execute(f"""
+        CREATE TABLE trending_top AS
+        SELECT * FROM read_parquet('{TOP_FILE.as_posix()}')
+        ORDER BY dt, project, board, rank
+    """)
+    if REDIRECT_MAP_FILE.exists():
+        # only redirects that have views matter to topic lookups; the full
+        # enwiki map is ~10M rows
+        con.execute(f"""
+            CREATE TABLE redirect_map AS
+            SELECT m.*
+            FROM read_parquet('{REDIRECT_MAP_FILE.as_posix()}') m
+            WHERE m.redirect_title IN (SELECT title FROM title_dict)
+            ORDER BY m.canonical_title
+        """)
+    if any(CANONICAL_DAILY_DIR.glob("dt=*/*.parquet")):
+        # opt-in (main.CANONICAL_PREAGGREGATE), for ad-hoc SQL on the catalog;
+        # the topic tab needs per-title matches, so it joins
+        # pageviews_daily_by_title instead
+        con.execute(f"""
+            CREATE VIEW pageviews_daily_canonical AS
+            SELECT * FROM read_parquet({_file_list(CANONICAL_DAILY_DIR.as_posix() + "/dt=*/data_*.parquet")})
+        """)
+    build_title_search(con)
+    con.execute("ANALYZE")
+    con.close()
+
+    tmp = CURRENT_FILE.with_suffix(".part")
+    tmp.write_text(name, encoding="utf-8")
+    tmp.replace(CURRENT_FILE)
+
+    # best effort: older catalogs may still be open in a running dashboard
+    for old in CATALOG_DIR.glob("catalog-*.duckdb*"):
+        if not old.name.startswith(name):
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+    print("DuckDB catalog written to:", path)
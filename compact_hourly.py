@@ -0,0 +1,114 @@
+import shutil
+from pathlib import Path
+import duckdb
+import pyarrow.parquet as pq
+
+from partition_manifest import load_manifest, save_manifest, files_by_dt, sql_file_list
+
+# Compaction of completed days: the 24 per-hour parquet files under
+# pageviews_hourly/dt=D/hour=HH/ are rewritten as one title-sorted file
+# under pageviews_hourly_compacted/dt=D/, and the hourly directory is
+# removed. Readers should go through hourly_files_by_dt(), which returns
+# the compacted file for finished days and the per-hour files otherwise.
+#
+# Both layouts stamp HOURLY_FORMAT_VERSION in the parquet key-value metadata.
+# Files without the current stamp (format 1 kept only the first 500,000 rows
+# of each dump) are dropped by drop_stale_hourly() so they get re-ingested.
+
+HOURLY_ROOT = Path("data/processed/pageviews_hourly")
+HOURLY_PATTERN = "dt=*/hour=*/part-*.parquet"
+
+COMPACTED_ROOT = Path("data/processed/pageviews_hourly_compacted")
+COMPACTED_PATTERN = "dt=*/part-*.parquet"
+
+HOURS_PER_DAY = 24
+ROW_GROUP_SIZE = 262_144
+
+HOURLY_FORMAT_VERSION = "2"
+FORMAT_KEY = "pageviews_format"
+FORMAT_MANIFEST_NAME = "hourly_format"
+
+
+def compacted_file(dt: str) -> Path:
+    return COMPACTED_ROOT / f"dt={dt}" / "part-0.parquet"
+
+
+def is_compacted(dt: str) -> bool:
+    return compacted_file(dt).exists()
+
+
+def is_current_format(path: Path) -> bool:
+    metadata = pq.read_schema(path).metadata or {}
+    return metadata.get(FORMAT_KEY.encode()) == HOURLY_FORMAT_VERSION.encode()
+
+
+def drop_stale_hourly() -> int:
+    """Delete hourly and compacted files written by an older format.
+
+    Runs once per format version (recorded in a manifest); files written
+    since carry the current stamp. Returns the number of files removed.
+    """
+    if load_manifest(FORMAT_MANIFEST_NAME).get("version") == HOURLY_FORMAT_VERSION:
+        return 0
+
+    files = [*HOURLY_ROOT.glob(HOURLY_PATTERN), *COMPACTED_ROOT.glob(COMPACTED_PATTERN)]
+    stale = [p for p in files if not is_current_format(p)]
+    for p in stale:
+        p.unlink()
+    save_manifest(FORMAT_MANIFEST_NAME, {"version": HOURLY_FORMAT_VERSION})
+
+    if stale:
+        print(f"Dropped {len(stale)} hourly file(s) from an older format; they will be re-ingested")
+    return len(stale)
+
+
+def hourly_files_by_dt() -> dict[str, list[Path]]:
+    """Hourly parquet inputs grouped by dt, preferring the compacted layout."""
+    out = files_by_dt(HOURLY_ROOT, HOURLY_PATTERN)
+    out.update(files_by_dt(COMPACTED_ROOT, COMPACTED_PATTERN))
+    return dict(sorted(out.items()))
+
+
+def hourly_file_list() -> list[Path]:
+    return [p for files in hourly_files_by_dt().values() for p in files]
+
+
+def compact_hourly():
+    """Merge each day with all 24 hours present into one sorted parquet file."""
+    hourly = files_by_dt(HOURLY_ROOT, HOURLY_PATTERN)
+
+    con = duckdb.connect()
+    compacted = 0
+
+    for dt, files in hourly.items():
+        day_dir = HOURLY_ROOT / f"dt={dt}"
+
+        if is_compacted(dt):
+            # leftover from a run interrupted after the compacted file landed
+            shutil.rmtree(day_dir, ignore_errors=True)
+            continue
+
+        hours = {p.parent.name for p in files}
+        if len(hours) < HOURS_PER_DAY:
+            continue
+
+        out_file = compacted_file(dt)
+        out_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = out_file.with_suffix(".parquet.part")
+
+        con.execute(f"""
+            COPY (
+                SELECT dt, hour, project, title, views
+                FROM read_parquet({sql_file_list(files)}, hive_partitioning = false)
+                ORDER BY title, project, hour
+            )
+            TO '{tmp_file.as_posix()}'
+            (FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE {ROW_GROUP_SIZE},
+             KV_METADATA {{{FORMAT_KEY}: '{HOURLY_FORMAT_VERSION}'}});
+        """)
+        tmp_file.replace(out_file)
+        shutil.rmtree(day_dir, ignore_errors=True)
+        compacted += 1
+
+    con.close()
+    print(f"Compacted {compacted} day(s) into:", COMPACTED_ROOT)
@@ -1,66 +1,144 @@
 from pathlib import Path
 import duckdb
 
-DAILY_GLOB = "data/aggregates/pageviews_daily/dt=*/data_*.parquet"
+from partition_manifest import (
+    load_manifest,
+    save_manifest,
+    files_by_dt,
+    fingerprint_by_dt,
+    changed_partitions,
+    drop_partitions,
+    sql_file_list,
+)
+
+DAILY_ROOT = Path("data/aggregates/pageviews_daily")
+DAILY_PATTERN = "dt=*/data_*.parquet"
+DAILY_GLOB = f"{DAILY_ROOT.as_posix()}/{DAILY_PATTERN}"
 FEAT_OUT_DIR = Path("data/aggregates/pageviews_daily_features")
 FEAT_OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-def build_features():
-    con = duckdb.connect()
+MANIFEST_NAME = "daily_features_v2"  # v2: title_id instead of title
 
-    rows = con.execute(
-        f"SELECT COUNT(*) FROM read_parquet('{DAILY_GLOB}')"
-    ).fetchone()[0]
-    if rows == 0:
-        con.close()
-        raise RuntimeError("No daily data found. Run aggregation first.")
+# the widest window below is 7 rows (6 preceding + current)
+LOOKBACK_DAYS = 6
 
-    con.execute(f"""
-        COPY (
-            WITH base AS (
-                SELECT dt, project, title, views
-                FROM read_parquet('{DAILY_GLOB}')
-            ),
-            w AS (
-                SELECT
-                    dt,
-                    project,
-                    title,
-                    views,
-                    LAG(views) OVER (PARTITION BY project, title ORDER BY dt) AS views_prev,
-                    AVG(views) OVER (
-                        PARTITION BY project, title
-                        ORDER BY dt
-                        ROWS BETWEEN 6 PRECEDING AND CURRENT ROW
-                    ) AS ma7,
-                    STDDEV_SAMP(views) OVER (
-                        PARTITION BY project, title
-                        ORDER BY dt
-                        ROWS BETWEEN 6 PRECEDING AND CURRENT ROW
-                    ) AS sd7
-                FROM base
-            )
+def features_sql(source: str, only_dts: list[str] | None = None) -> str:
+    """SELECT computing the window features over `source` (any daily relation)."""
+    where = ""
+    if only_dts is not None:
+        where = "WHERE CAST(dt AS VARCHAR) IN (" + ", ".join(f"'{d}'" for d in only_dts) + ")"
+
+    return f"""
+        WITH base AS (
+            SELECT dt, project, title_id, views
+            FROM {source}
+        ),
+        w AS (
             SELECT
                 dt,
                 project,
-                title,
+                title_id,
                 views,
-                views_prev,
-                views - views_prev AS delta,
-                CASE
-                    WHEN views_prev IS NULL OR views_prev = 0 THEN NULL
-                    ELSE (views - views_prev) * 1.0 / views_prev
-                END AS pct_change,
-                ma7,
-                CASE
-                    WHEN sd7 IS NULL OR sd7 = 0 THEN NULL
-                    ELSE (views - ma7) * 1.0 / sd7
-                END AS z7
-            FROM w
+                LAG(views) OVER (PARTITION BY project, title_id ORDER BY dt) AS views_prev,
+                AVG(views) OVER (
+                    PARTITION BY project, title_id
+                    ORDER BY dt
+                    ROWS BETWEEN 6 PRECEDING AND CURRENT ROW
+                ) AS ma7,
+                STDDEV_SAMP(views) OVER (
+                    PARTITION BY project, title_id
+                    ORDER BY dt
+                    ROWS BETWEEN 6 PRECEDING AND CURRENT ROW
+                ) AS sd7
+            FROM base
+        )
+        SELECT
+            dt,
+            project,
+            title_id,
+            views,
+            views_prev,
+            views - views_prev AS delta,
+            CASE
+                WHEN views_prev IS NULL OR views_prev = 0 THEN NULL
+                ELSE (views - views_prev) * 1.0 / views_prev
+            END AS pct_change,
+            ma7,
+            CASE
+                WHEN sd7 IS NULL OR sd7 = 0 THEN NULL
+                ELSE (views - ma7) * 1.0 / sd7
+            END AS z7
+        FROM w
+        {where}
+    """
+
+def _affected_dates(all_dts: list[str], changed: list[str], removed: list[str]) -> list[str]:
+    """A change on day d also moves the features of the next LOOKBACK_DAYS days."""
+    affected = set()
+    for d in changed + removed:
+        later = [x for x in all_dts if x >= d]
+        affected.update(later[: LOOKBACK_DAYS + 1])
+    return sorted(affected)
+
+def build_features(incremental: bool = False):
+    """Compute daily window features (views_prev, ma7, z7, ...).
+
+    With incremental=True only the days affected by changed daily partitions
+    are recomputed, reading just those days plus a LOOKBACK_DAYS slice of
+    earlier days; older feature partitions are left untouched. The lookback
+    is counted in dataset days, so a title missing from some of those days
+    can see a shorter window than a full rebuild would give it.
+    """
+    daily_files = files_by_dt(DAILY_ROOT, DAILY_PATTERN)
+    current = fingerprint_by_dt(daily_files)
+    if not current:
+        raise RuntimeError("No daily data found. Run aggregation first.")
+
+    con = duckdb.connect()
+
+    if incremental:
+        changed, removed = changed_partitions(current, load_manifest(MANIFEST_NAME))
+        drop_partitions(FEAT_OUT_DIR, removed)
+
+        all_dts = sorted(current)
+        affected = _affected_dates(all_dts, changed, removed)
+        affected = [d for d in affected if d in current]
+        if not affected:
+            con.close()
+            save_manifest(MANIFEST_NAME, current)
+            print("Daily features are up to date; nothing to do.")
+            return
+
+        first = all_dts.index(affected[0])
+        window_dts = all_dts[max(0, first - LOOKBACK_DAYS): all_dts.index(affected[-1]) + 1]
+        source = f"read_parquet({sql_file_list([p for d in window_dts for p in daily_files[d]])})"
+        print(
+            f"Recomputing features for {len(affected)} day(s) "
+            f"({affected[0]} .. {affected[-1]}) from {len(window_dts)} day(s) of daily data"
+        )
+
+        drop_partitions(FEAT_OUT_DIR, affected)
+        query = features_sql(source, only_dts=affected)
+        write_mode = "OVERWRITE_OR_IGNORE 1"
+    else:
+        rows = con.execute(
+            f"SELECT COUNT(*) FROM read_parquet('{DAILY_GLOB}')"
+        ).fetchone()[0]
+        if rows == 0:
+            con.close()
+            raise RuntimeError("No daily data found. Run aggregation first.")
+
+        query = features_sql(f"read_parquet('{DAILY_GLOB}')")
+        write_mode = "OVERWRITE 1"
+
+    con.execute(f"""
+        COPY (
+            {query}
         )
         TO '{FEAT_OUT_DIR.as_posix()}'
-        (FORMAT PARQUET, PARTITION_BY (dt), COMPRESSION ZSTD, OVERWRITE 1);
+        (FORMAT PARQUET, PARTITION_BY (dt), COMPRESSION ZSTD, {write_mode});
     """)
 
     con.close()
+    save_manifest(MANIFEST_NAME, current)
     print("Daily features written to:", FEAT_OUT_DIR)
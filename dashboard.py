@@ -8,11 +8,17 @@ try:
 except Exception:
     _HAS_ALTAIR = False
 
-from topic_series import build_topic_series
+from topic_series import build_topic_series, build_topics_series
+from catalog import CATALOG_DIR, current_catalog, connect_catalog
+from data_version import read_data_version
+from title_search import lookup_titles
 
-TREND_GLOB = "data/aggregates/pageviews_daily_trending/**/*.parquet"
-DAILY_GLOB = "data/aggregates/pageviews_daily/**/*.parquet"
-HOURLY_GLOB = "data/processed/pageviews_hourly/**/*.parquet"
+# query results are cached per (data version, parameters)
+CACHE_TTL_S = 15 * 60
+CACHE_MAX_ENTRIES = 512
+
+# most articles / topics the comparison tab overlays
+COMPARE_MAX = 8
 
 # Display-name mapping (UI only)
 DISPLAY_RENAME = {
@@ -28,32 +34,159 @@ DISPLAY_RENAME = {
 st.set_page_config(layout="wide")
 st.title("Wikipedia Trends Dashboard")
 
-con = duckdb.connect()
+# -----------------------------
+# Catalog connection
+# -----------------------------
+@st.cache_resource(max_entries=1)
+def get_catalog_connection(catalog_name: str) -> duckdb.DuckDBPyConnection:
+    # one shared read-only connection per published catalog; a new build
+    # publishes a new file name, which opens a fresh connection
+    return connect_catalog(CATALOG_DIR / catalog_name)
+
+catalog_path = current_catalog()
+if catalog_path is None:
+    st.error("No DuckDB catalog found. Run the pipeline (main.py) to build it.")
+    st.stop()
+
+# cursors are cheap and safe to use from concurrent sessions
+con = get_catalog_connection(catalog_path.name).cursor()
+
+# every cached query takes this as its first argument, so publishing new
+# data (build_trends / a new catalog) invalidates all cached results
+data_version = f"{read_data_version()}:{catalog_path.name}"
+
+cached_query = st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
 
 # -----------------------------
 # Helpers
 # -----------------------------
-def get_available_trending_dates() -> list[str]:
+@cached_query
+def get_available_trending_dates(version: str) -> list[str]:
     df = con.execute(
-        f"""
+        """
         SELECT DISTINCT dt
-        FROM read_parquet('{TREND_GLOB}')
+        FROM trending_top
         ORDER BY dt DESC
         """
     ).df()
     return df["dt"].astype(str).tolist()
 
-def get_latest_trending_date() -> str | None:
+@cached_query
+def get_latest_trending_date(version: str) -> str | None:
     df = con.execute(
-        f"""
+        """
         SELECT MAX(dt) AS latest_dt
-        FROM read_parquet('{TREND_GLOB}')
+        FROM trending_top
         """
     ).df()
     if df.empty or pd.isna(df.loc[0, "latest_dt"]):
         return None
     return str(df.loc[0, "latest_dt"])
 
+@cached_query
+def get_leaderboard(version: str, dt: str, board: str, limit: int = 20) -> pd.DataFrame:
+    # precomputed by build_trends; "all" ranks across every project
+    return con.execute(
+        """
+        SELECT dt, title, views, delta, up_score, down_score
+        FROM trending_top
+        WHERE dt = ?
+          AND project = 'all'
+          AND board = ?
+        ORDER BY rank
+        LIMIT ?
+        """,
+        [dt, board, limit],
+    ).df()
+
+@cached_query
+def search_titles(version: str, q: str) -> pd.DataFrame:
+    # prebuilt prefix / trigram index, see title_search.py
+    return lookup_titles(con, q)
+
+@cached_query
+def get_daily_series(version: str, title_id: int) -> pd.DataFrame:
+    # title-clustered copy: row-group stats narrow this to a few row groups
+    return con.execute(
+        """
+        SELECT dt, SUM(views) AS views
+        FROM pageviews_daily_by_title
+        WHERE title_id = ?
+        GROUP BY dt
+        ORDER BY dt
+        """,
+        [title_id],
+    ).df()
+
+@cached_query
+def get_hourly_series(version: str, dt: str, title_id: int) -> pd.DataFrame:
+    # the dt predicate prunes to one file, title_id to a few row groups
+    return con.execute(
+        """
+        SELECT hour, SUM(views) AS views
+        FROM pageviews_hourly_by_title
+        WHERE dt = ?
+          AND title_id = ?
+        GROUP BY hour
+        ORDER BY hour
+        """,
+        [dt, title_id],
+    ).df()
+
+@cached_query
+def get_topic_series(version: str, query: str, projects: tuple[str, ...]):
+    return build_topic_series(con, query, projects=projects)
+
+@cached_query
+def get_topics_series(version: str, queries: tuple[str, ...], projects: tuple[str, ...]):
+    # one scan for all topics, see topic_series.build_topics_series
+    return build_topics_series(con, list(queries), projects=projects)
+
+def _compare_ids(pairs: tuple[tuple[str, int], ...]) -> pd.DataFrame:
+    return pd.DataFrame(list(pairs), columns=["label", "title_id"])
+
+@cached_query
+def get_compare_daily(version: str, pairs: tuple[tuple[str, int], ...], projects: tuple[str, ...]) -> pd.DataFrame:
+    # pairs are (series label, title_id); one join against the registered
+    # pairs serves every series. Same project filter as build_topics_series,
+    # so article and topic series are summed the same way
+    con.register("compare_ids", _compare_ids(pairs))
+    try:
+        return con.execute(
+            """
+            SELECT c.label, p.dt, SUM(p.views) AS views
+            FROM pageviews_daily_by_title p
+            JOIN compare_ids c USING (title_id)
+            WHERE p.project IN (SELECT * FROM UNNEST(?))
+            GROUP BY c.label, p.dt
+            ORDER BY c.label, p.dt
+            """,
+            [list(projects)],
+        ).df()
+    finally:
+        con.unregister("compare_ids")
+
+@cached_query
+def get_compare_hourly(version: str, dt: str, pairs: tuple[tuple[str, int], ...], projects: tuple[str, ...]) -> pd.DataFrame:
+    # a label may cover several titles (a topic); the dt predicate prunes to
+    # one file
+    con.register("compare_ids", _compare_ids(pairs))
+    try:
+        return con.execute(
+            """
+            SELECT c.label, p.hour, SUM(p.views) AS views
+            FROM pageviews_hourly_by_title p
+            JOIN compare_ids c USING (title_id)
+            WHERE p.dt = ?
+              AND p.project IN (SELECT * FROM UNNEST(?))
+            GROUP BY c.label, p.hour
+            ORDER BY c.label, p.hour
+            """,
+            [dt, list(projects)],
+        ).df()
+    finally:
+        con.unregister("compare_ids")
+
 def pretty_title(t: str) -> str:
     return t.replace("_", " ")
 
@@ -83,6 +216,27 @@ def make_line_chart(df: pd.DataFrame, x_col: str, y_col: str, tooltip_cols: list
         )
     )
 
+def make_compare_chart(df: pd.DataFrame, x_col: str, x_type: str, x_title: str, y_title: str):
+    if not _HAS_ALTAIR or df.empty:
+        return None
+    return (
+        alt.Chart(df)
+        .mark_line(point=x_type == "O")
+        .encode(
+            x=alt.X(f"{x_col}:{x_type}", title=x_title),
+            y=alt.Y("views:Q", title=y_title),
+            color=alt.Color("label:N", title=None),
+            tooltip=["label", x_col, "views"],
+        )
+    )
+
+def show_compare(df: pd.DataFrame, x_col: str, x_type: str, x_title: str, y_title: str):
+    chart = make_compare_chart(df, x_col, x_type, x_title, y_title)
+    if chart is not None:
+        st.altair_chart(chart, use_container_width=True)
+    else:
+        st.line_chart(df.pivot(index=x_col, columns="label", values="views"))
+
 def display_table(df: pd.DataFrame) -> pd.DataFrame:
     # Rename columns for display only; keep raw df for charts/calcs
     out = df.copy()
@@ -92,12 +246,12 @@ def display_table(df: pd.DataFrame) -> pd.DataFrame:
 # -----------------------------
 # Date selector
 # -----------------------------
-dates = get_available_trending_dates()
+dates = get_available_trending_dates(data_version)
 if not dates:
-    st.error("No trending data found. Check TREND_GLOB and confirm your trending parquet exists.")
+    st.error("No trending data found. Confirm build_trends has run and the catalog is rebuilt.")
     st.stop()
 
-latest_dt = get_latest_trending_date()
+latest_dt = get_latest_trending_date(data_version)
 default_index = dates.index(latest_dt) if latest_dt in dates else 0
 selected_dt = st.selectbox("Select date", dates, index=default_index)
 
@@ -111,16 +265,7 @@ col_up, col_down = st.columns(2)
 with col_up:
     st.markdown("### Trending Up (increasing attention)")
 
-    df_up = con.execute(
-        f"""
-        SELECT dt, title, views, delta, up_score, down_score
-        FROM read_parquet('{TREND_GLOB}')
-        WHERE dt = ?
-        ORDER BY up_score DESC
-        LIMIT 20
-        """,
-        [selected_dt],
-    ).df()
+    df_up = get_leaderboard(data_version, selected_dt, "up")
 
     if not df_up.empty:
         # RAW for charts
@@ -153,17 +298,7 @@ with col_up:
 with col_down:
     st.markdown("### Trending Down (declining attention)")
 
-    df_down = con.execute(
-        f"""
-        SELECT dt, title, views, delta, up_score, down_score
-        FROM read_parquet('{TREND_GLOB}')
-        WHERE dt = ?
-          AND delta < 0
-        ORDER BY down_score DESC
-        LIMIT 20
-        """,
-        [selected_dt],
-    ).df()
+    df_down = get_leaderboard(data_version, selected_dt, "down")
 
     if not df_down.empty:
         # RAW for charts
@@ -200,7 +335,7 @@ st.divider()
 # -----------------------------
 st.subheader("Explore")
 
-tab1, tab2 = st.tabs(["Article (dataset search)", "Topic (Wikidata canonicalization)"])
+tab1, tab2, tab3 = st.tabs(["Article (dataset search)", "Topic (Wikidata canonicalization)", "Compare"])
 
 # --- Tab 1: Article explorer ---
 with tab1:
@@ -208,18 +343,9 @@ with tab1:
     q = st.text_input("Search title (spaces ok). Example: New York City", key="article_search")
 
     selected_title = None
+    selected_title_id = None
     if q:
-        candidates = con.execute(
-            f"""
-            SELECT title, SUM(views) AS total_views
-            FROM read_parquet('{DAILY_GLOB}')
-            WHERE title ILIKE '%' || REPLACE(?, ' ', '_') || '%'
-            GROUP BY title
-            ORDER BY total_views DESC
-            LIMIT 50
-            """,
-            [q],
-        ).df()
+        candidates = search_titles(data_version, q)
 
         if candidates.empty:
             st.warning("No matches found. Try fewer characters.")
@@ -231,22 +357,15 @@ with tab1:
                 + " views)"
             )
             label = st.selectbox("Select a title", candidates["label"].tolist(), key="article_select")
-            selected_title = candidates.loc[candidates["label"] == label, "title"].iloc[0]
+            selected = candidates.loc[candidates["label"] == label].iloc[0]
+            selected_title = selected["title"]
+            selected_title_id = int(selected["title_id"])
 
     if selected_title:
         st.write(f"Selected title: `{selected_title}`")
 
         # Daily series (all available dates)
-        df_ts = con.execute(
-            f"""
-            SELECT dt, SUM(views) AS views
-            FROM read_parquet('{DAILY_GLOB}')
-            WHERE title = ?
-            GROUP BY dt
-            ORDER BY dt
-            """,
-            [selected_title],
-        ).df()
+        df_ts = get_daily_series(data_version, selected_title_id)
 
         if df_ts.empty:
             st.warning("No daily data found for this title.")
@@ -265,17 +384,7 @@ with tab1:
                 st.line_chart(df_ts.set_index("dt")["views"])
 
         # Hourly series (for selected date)
-        df_hr = con.execute(
-            f"""
-            SELECT hour, SUM(views) AS views
-            FROM read_parquet('{HOURLY_GLOB}')
-            WHERE dt = ?
-              AND title = ?
-            GROUP BY hour
-            ORDER BY hour
-            """,
-            [selected_dt, selected_title],
-        ).df()
+        df_hr = get_hourly_series(data_version, selected_dt, selected_title_id)
 
         st.markdown(f"#### Hourly views on {selected_dt}")
         if df_hr.empty:
@@ -313,7 +422,7 @@ with tab2:
     )
 
     if topic_q:
-        series_df, meta = build_topic_series(con, topic_q, projects=tuple(projects))
+        series_df, meta = get_topic_series(data_version, topic_q, tuple(projects))
 
         if series_df is None:
             st.error(meta.get("error", "Unknown error"))
@@ -342,4 +451,65 @@ with tab2:
             else:
                 st.line_chart(series_df.set_index("dt")["views_topic"])
 
+# --- Tab 3: Side-by-side comparison ---
+with tab3:
+    st.markdown(
+        f"Overlay the daily and hourly views of up to {COMPARE_MAX} articles or topics. "
+        "Each chart is one batched query, however many series it shows."
+    )
+    mode = st.radio("Compare", ["Articles", "Topics"], horizontal=True, key="compare_mode")
+    # applies to both modes, so every series is summed over the same projects
+    compare_projects = tuple(st.multiselect(
+        "Projects to include", ["en", "en.m"], default=["en"], key="compare_projects",
+    ))
+
+    pairs = []
+    df_cmp_daily = None
+    if mode == "Articles":
+        # search results are added to the options. The picks are kept apart
+        # from the widget, which resets whenever its options change.
+        known = st.session_state.setdefault("compare_known", {})
+        cq = st.text_input("Search titles to add", key="compare_search")
+        if cq:
+            found = search_titles(data_version, cq)
+            known.update(zip(found["title"], found["title_id"].astype(int)))
+        picked = st.multiselect(
+            "Articles",
+            list(known),
+            default=st.session_state.get("compare_picked", []),
+            format_func=pretty_title,
+            max_selections=COMPARE_MAX,
+        )
+        st.session_state["compare_picked"] = picked
+        pairs = [(pretty_title(t), int(known[t])) for t in picked]
+    else:
+        topics_text = st.text_area("Topics, one per line", key="compare_topics")
+        queries = [t.strip() for t in topics_text.splitlines() if t.strip()]
+        if len(queries) > COMPARE_MAX:
+            st.warning(f"Only the first {COMPARE_MAX} topics are compared.")
+            queries = queries[:COMPARE_MAX]
+        if queries:
+            # the topic engine's scan already yields the daily series
+            topic_daily, metas = get_topics_series(data_version, tuple(queries), compare_projects)
+            df_cmp_daily = topic_daily.rename(columns={"topic": "label", "views_topic": "views"})
+            for q, meta in metas.items():
+                if "error" in meta:
+                    st.warning(f"{q}: {meta['error']}")
+                else:
+                    pairs += [(q, title_id) for title_id in meta["matched_title_ids"]]
+
+    if pairs:
+        pairs = tuple(pairs)
+        st.markdown("#### Daily views")
+        if df_cmp_daily is None:
+            df_cmp_daily = get_compare_daily(data_version, pairs, compare_projects)
+        show_compare(df_cmp_daily, x_col="dt", x_type="T", x_title="Date", y_title="Daily views")
+
+        st.markdown(f"#### Hourly views on {selected_dt}")
+        df_cmp_hr = get_compare_hourly(data_version, selected_dt, pairs, compare_projects)
+        if df_cmp_hr.empty:
+            st.info("No hourly rows for the selection on this date.")
+        else:
+            show_compare(df_cmp_hr, x_col="hour", x_type="O", x_title="Hour (0-23)", y_title="Views")
+
 con.close()
@@ -0,0 +1,23 @@
+import time
+from pathlib import Path
+
+# A single stamp bumped whenever the pipeline publishes new served data.
+# The dashboard keys its query cache on it, so cached results are dropped
+# as soon as a new build lands.
+
+DATA_VERSION_FILE = Path("data/aggregates/DATA_VERSION")
+
+
+def publish_data_version() -> str:
+    version = str(time.time_ns())
+    DATA_VERSION_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = DATA_VERSION_FILE.with_suffix(".part")
+    tmp.write_text(version, encoding="utf-8")
+    tmp.replace(DATA_VERSION_FILE)
+    return version
+
+
+def read_data_version() -> str:
+    if not DATA_VERSION_FILE.exists():
+        return "0"
+    return DATA_VERSION_FILE.read_text(encoding="utf-8").strip()
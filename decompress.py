@@ -0,0 +1,152 @@
+import io
+import gzip
+import queue
+import shutil
+import threading
+import subprocess
+from pathlib import Path
+from contextlib import contextmanager
+
+# "auto" picks the fastest available option: pigz, then gzip, then "thread"
+# "pigz" / "gzip": pipe through an external `<tool> -dc` process
+# "thread": stdlib zlib running in a background thread
+# "stdlib": plain gzip.open in the calling thread
+DECOMPRESSOR = "auto"
+
+DECOMPRESS_CHUNK = 4 * 1024 * 1024  # 4 MB of decompressed bytes per read
+QUEUE_DEPTH = 4  # chunks buffered ahead of the consumer by the background thread
+
+
+class _BackgroundReader(io.RawIOBase):
+    """Read `raw` in large chunks on a background thread.
+
+    zlib releases the GIL while inflating, so decompression of the next chunk
+    overlaps with parsing of the current one. Memory is bounded by
+    QUEUE_DEPTH * chunk_size.
+    """
+
+    def __init__(self, raw, chunk_size: int = DECOMPRESS_CHUNK, depth: int = QUEUE_DEPTH):
+        self._raw = raw
+        self._chunk_size = chunk_size
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._buf = memoryview(b"")
+        self._eof = False
+        self._thread = threading.Thread(target=self._pump, daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _pump(self):
+        try:
+            while True:
+                chunk = self._raw.read(self._chunk_size)
+                if not self._put(chunk) or not chunk:
+                    return
+        except BaseException as e:
+            self._put(e)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if not self._buf:
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if isinstance(item, BaseException):
+                self._eof = True
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._buf = memoryview(item)
+
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._raw.close()
+        super().close()
+
+
+def _resolve(decompressor: str) -> str:
+    if decompressor == "auto":
+        for tool in ("pigz", "gzip"):
+            if shutil.which(tool):
+                return tool
+        return "thread"
+    if decompressor in ("pigz", "gzip") and not shutil.which(decompressor):
+        raise RuntimeError(f"Decompressor {decompressor!r} requested but not found on PATH")
+    if decompressor not in ("pigz", "gzip", "thread", "stdlib"):
+        raise ValueError(f"Unknown decompressor: {decompressor!r}")
+    return decompressor
+
+
+@contextmanager
+def open_gz_stream(fileobj, decompressor: str = "thread"):
+    """Decompress an already-open binary gzip stream (e.g. an HTTP body)."""
+    gz = gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if decompressor == "stdlib":
+        with gz:
+            yield gz
+        return
+
+    with io.BufferedReader(_BackgroundReader(gz), buffer_size=DECOMPRESS_CHUNK) as f:
+        yield f
+
+
+@contextmanager
+def open_dump(gz_path: Path, decompressor: str = DECOMPRESSOR):
+    """Open a .gz dump as a binary stream of decompressed bytes.
+
+    Nothing is decoded here; callers filter on raw bytes and decode only what
+    they keep. Corrupt input raises (OSError / EOFError / BadGzipFile) just
+    like gzip.open would.
+    """
+    mode = _resolve(decompressor)
+
+    if mode == "stdlib":
+        with gzip.open(gz_path, "rb") as f:
+            yield f
+        return
+
+    if mode == "thread":
+        with open(gz_path, "rb") as raw:
+            with open_gz_stream(raw, "thread") as f:
+                yield f
+        return
+
+    proc = subprocess.Popen(
+        [shutil.which(mode), "-dc", str(gz_path)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=DECOMPRESS_CHUNK,
+    )
+    ok = False
+    try:
+        yield proc.stdout
+        ok = True
+    finally:
+        if not ok:
+            proc.kill()
+        proc.stdout.close()
+        err = proc.stderr.read()
+        proc.stderr.close()
+        rc = proc.wait()
+
+    if rc != 0:
+        msg = err.decode("utf-8", errors="replace").strip()
+        raise OSError(f"{mode} -dc failed on {Path(gz_path).name} (exit {rc}): {msg}")
@@ -0,0 +1,113 @@
+import io
+import time
+import hashlib
+import threading
+from pathlib import Path
+
+from partition_manifest import load_manifest, save_manifest
+
+# Checksum verification for downloaded dumps. Each monthly dump directory
+# publishes an md5sums.txt ("<md5>  <filename>" per line); files are hashed
+# while they stream in, mismatches are moved to QUARANTINE_DIR, and files
+# that passed are recorded in a manifest so later runs don't re-hash them.
+
+MD5SUMS_NAME = "md5sums.txt"
+QUARANTINE_DIR = Path("data/raw/quarantine")
+VERIFIED_MANIFEST = "verified_dumps"
+HASH_CHUNK = 4 * 1024 * 1024
+
+
+class ChecksumMismatch(ValueError):
+    pass
+
+
+def parse_md5sums(text: str) -> dict[str, str]:
+    """{filename: md5} from an md5sums listing."""
+    sums = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and len(parts[0]) == 32:
+            sums[parts[1].lstrip("*")] = parts[0].lower()
+    return sums
+
+
+def md5_file(path: Path):
+    """hashlib md5 object fed with the contents of `path`."""
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            h.update(chunk)
+    return h
+
+
+def quarantine(path: Path) -> Path:
+    QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+    dest = QUARANTINE_DIR / f"{path.name}.{time.time_ns()}"
+    path.replace(dest)
+    return dest
+
+
+class HashingReader(io.RawIOBase):
+    """Pass-through reader that md5-hashes every byte read from `raw`."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.md5 = hashlib.md5()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self._raw.read(len(b))
+        n = len(data)
+        b[:n] = data
+        self.md5.update(data)
+        return n
+
+    def drain(self) -> None:
+        """Hash whatever the consumer left unread."""
+        while self.readinto(bytearray(HASH_CHUNK)):
+            pass
+
+
+class VerifiedManifest:
+    """Thread-safe {filename: {md5, size}} record of files that passed."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = load_manifest(VERIFIED_MANIFEST)
+
+    def is_verified(self, path: Path, md5: str | None = None) -> bool:
+        with self._lock:
+            entry = self._entries.get(path.name)
+        if entry is None or not path.exists():
+            return False
+        if md5 is not None and entry["md5"] != md5:
+            return False
+        return entry["size"] == path.stat().st_size
+
+    def check(self, path: Path, md5: str | None) -> bool:
+        """True if `path` is a good download; a bad one is quarantined.
+
+        Files not in the manifest yet (e.g. fetched before verification
+        existed) are hashed once and recorded.
+        """
+        if not path.exists():
+            return False
+        if md5 is None:
+            return path.stat().st_size > 0
+        if self.is_verified(path, md5):
+            return True
+        if md5_file(path).hexdigest() == md5:
+            self.record(path, md5)
+            return True
+        print(f"Checksum mismatch, quarantined: {quarantine(path)}")
+        return False
+
+    def record(self, path: Path, md5: str) -> None:
+        with self._lock:
+            self._entries[path.name] = {"md5": md5, "size": path.stat().st_size}
+
+    def save(self) -> None:
+        with self._lock:
+            save_manifest(VERIFIED_MANIFEST, dict(self._entries))
@@ -0,0 +1,57 @@
+import duckdb
+
+from partition_manifest import save_manifest, fingerprint_by_dt, sql_file_list
+from compact_hourly import hourly_files_by_dt
+from aggregate_data import (
+    DAILY_OUT_DIR,
+    MANIFEST_NAME as DAILY_MANIFEST_NAME,
+    daily_sql,
+)
+from create_features import features_sql
+from title_dictionary import update_title_dictionary
+from build_trending import TREND_OUT_DIR, write_trending
+
+# Single-connection alternative to aggregate_data -> build_features ->
+# build_trends. The daily totals are materialized once as a temp table
+# (DuckDB spills it to disk if needed) and both served datasets are written
+# from it; the features dataset is never written, and there are no COUNT(*)
+# sanity scans over parquet.
+
+def run_fused_pipeline():
+    hourly_files = hourly_files_by_dt()
+    if not hourly_files:
+        raise RuntimeError("No hourly files found. Run process_data first.")
+    source = sql_file_list([p for files in hourly_files.values() for p in files])
+
+    update_title_dictionary()
+
+    con = duckdb.connect()
+
+    print("Aggregating hourly -> daily (in memory)...")
+    # CTAS reports the number of rows it inserted, so the emptiness check
+    # costs no extra scan
+    (n_rows,) = con.execute(f"""
+        CREATE TEMP TABLE daily AS
+        {daily_sql(f"read_parquet({source}, hive_partitioning = false)")}
+    """).fetchone()
+
+    if n_rows == 0:
+        con.close()
+        raise RuntimeError("No hourly rows found. Run process_data first.")
+
+    print(f"Writing {n_rows:,} daily aggregates to:\n  {DAILY_OUT_DIR.resolve()}")
+    con.execute(f"""
+        COPY daily
+        TO '{DAILY_OUT_DIR.as_posix()}'
+        (FORMAT PARQUET, PARTITION_BY (dt), COMPRESSION ZSTD, OVERWRITE 1);
+    """)
+
+    print(f"Computing features and trends, writing to:\n  {TREND_OUT_DIR.resolve()}")
+    write_trending(con, f"({features_sql('daily')})")
+
+    con.close()
+
+    # pageviews_daily was fully rebuilt, so the staged incremental
+    # aggregation can pick up from here
+    save_manifest(DAILY_MANIFEST_NAME, fingerprint_by_dt(hourly_files))
+    print("Done. Fused pipeline wrote daily and trending datasets.")
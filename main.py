@@ -11,34 +11,69 @@
 #           - tqdm, python-dateutil, humanize - for visualization
 #***********************************************************************************
 
-from request_data import fetch_data
-from process_data import process_data
-from aggregate_data import aggregate_data
-from create_features import build_features
-from build_trending import build_trends
+from pipeline import run_pipeline, stages
+from request_data import START_DATE, END_DATE
 
+import argparse
 import subprocess
 import sys
 import os
+from datetime import date
 
-def main():
-    print("=== Wikipedia Trend Visualizer ===")
-    print("Fetching raw data from https://dumps.wikimedia.org...")
-    fetch_data()
+# parse dumps to parquet while downloading instead of storing the raw .gz files
+FUSED_FETCH = False
+
+# run aggregation, features and trends as one DuckDB job (skips writing the
+# features dataset, which the dashboard doesn't read)
+FUSED_PIPELINE = False
+
+# also write pageviews_daily_canonical, with redirect views added to their
+# target article (needs the enwiki SQL dumps, see redirect_map.py)
+CANONICAL_PREAGGREGATE = False
 
-    print("All present data was fetched. Processing...")
-    process_data()
+def parse_args(argv=None):
+    stage_names = [s["name"] for s in stages(fused=FUSED_PIPELINE, canonical=CANONICAL_PREAGGREGATE)]
+    parser = argparse.ArgumentParser(
+        description="Wikipedia Trend Visualizer pipeline. Stages whose inputs "
+                    "haven't changed since their last run are skipped.",
+    )
+    parser.add_argument("--start", type=date.fromisoformat, default=START_DATE,
+                        help=f"first day to ingest, YYYY-MM-DD (default {START_DATE})")
+    parser.add_argument("--end", type=date.fromisoformat, default=END_DATE,
+                        help=f"last day to ingest, inclusive (default {END_DATE})")
+    parser.add_argument("--stage", action="append", choices=stage_names, dest="stages",
+                        help="run only this stage (repeatable)")
+    parser.add_argument("--force", action="store_true",
+                        help="run the selected stages even if they look up to date")
+    parser.add_argument("--no-dashboard", action="store_true",
+                        help="don't launch streamlit afterwards")
+    return parser.parse_args(argv)
 
-    print("Data has been processed. Aggregating...")
-    aggregate_data()
+def main(argv=None):
+    args = parse_args(argv)
 
-    print("Aggregation done. Building features...")
-    build_features()
+    print("=== Wikipedia Trend Visualizer ===")
+    print(f"Ingest window: {args.start} .. {args.end}")
+    outcome = run_pipeline(
+        args.start,
+        args.end,
+        only=args.stages,
+        force=args.force,
+        fused=FUSED_PIPELINE,
+        fused_fetch=FUSED_FETCH,
+        canonical=CANONICAL_PREAGGREGATE,
+    )
 
-    print("Features built. Forming trends...")
-    build_trends()
+    if args.no_dashboard:
+        return
 
-    print("Trends built. Launching dashboard...")
+    catalog = outcome.get("catalog")
+    if catalog == "ran":
+        print("Catalog published. Launching dashboard...")
+    elif catalog == "skipped":
+        print("Catalog up to date. Launching dashboard...")
+    else:
+        print("Catalog stage not run; launching dashboard on the last published catalog...")
 
     subprocess.run(
         [
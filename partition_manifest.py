@@ -0,0 +1,72 @@
+import json
+import shutil
+import hashlib
+from pathlib import Path
+
+# Small JSON manifests that let the batch stages tell which dt partitions
+# changed since their last run. A partition's fingerprint is a hash of the
+# (name, size, mtime) of the files it is built from.
+
+STATE_DIR = Path("data/state")
+
+
+def _manifest_path(name: str) -> Path:
+    return STATE_DIR / f"{name}.json"
+
+
+def load_manifest(name: str) -> dict:
+    path = _manifest_path(name)
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(name: str, manifest: dict) -> None:
+    """Write atomically so an interrupted run never leaves a torn manifest."""
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _manifest_path(name)
+    tmp = path.with_suffix(".json.part")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    tmp.replace(path)
+
+
+def files_fingerprint(paths: list[Path]) -> str:
+    h = hashlib.sha1()
+    for p in sorted(paths):
+        st = p.stat()
+        h.update(f"{p.as_posix()}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def files_by_dt(root: Path, pattern: str) -> dict[str, list[Path]]:
+    """Group the files matching `pattern` under `root` by their dt=... directory."""
+    out: dict[str, list[Path]] = {}
+    for p in root.glob(pattern):
+        dt_dir = next((part for part in p.relative_to(root).parts if part.startswith("dt=")), None)
+        if dt_dir is None:
+            continue
+        out.setdefault(dt_dir[len("dt="):], []).append(p)
+    return {dt: sorted(files) for dt, files in sorted(out.items())}
+
+
+def fingerprint_by_dt(files: dict[str, list[Path]]) -> dict[str, str]:
+    return {dt: files_fingerprint(paths) for dt, paths in files.items()}
+
+
+def changed_partitions(current: dict[str, str], previous: dict[str, str]) -> tuple[list[str], list[str]]:
+    """Return (changed_or_new, removed) dt lists."""
+    changed = sorted(dt for dt, fp in current.items() if previous.get(dt) != fp)
+    removed = sorted(dt for dt in previous if dt not in current)
+    return changed, removed
+
+
+def drop_partitions(out_dir: Path, dts: list[str]) -> None:
+    for dt in dts:
+        shutil.rmtree(out_dir / f"dt={dt}", ignore_errors=True)
+
+
+def sql_file_list(paths: list[Path]) -> str:
+    """Render paths as a DuckDB list literal for read_parquet([...])."""
+    return "[" + ", ".join("'" + p.as_posix().replace("'", "''") + "'" for p in paths) + "]"
@@ -0,0 +1,288 @@
+import time
+import hashlib
+from datetime import date, datetime
+from pathlib import Path
+
+import requests
+
+import api_cache
+from api_cache import OfflineCacheMiss
+from partition_manifest import load_manifest, save_manifest, files_fingerprint
+from request_data import START_DATE, END_DATE, fetch_data, missing_local_hours
+from process_data import IN_DIR, OUT_DIR as HOURLY_DIR, process_data
+from compact_hourly import (
+    COMPACTED_ROOT, HOURS_PER_DAY, HOURLY_FORMAT_VERSION, compact_hourly, hourly_files_by_dt, is_compacted,
+)
+from title_dictionary import TITLE_DICT_DIR
+from aggregate_data import DAILY_OUT_DIR, aggregate_data
+from create_features import FEAT_OUT_DIR, build_features
+from build_trending import TREND_OUT_DIR, TOP_OUT_FILE, build_trends
+from fused_pipeline import run_fused_pipeline
+from title_clustered import (
+    DAILY_BY_TITLE_DIR, HOURLY_BY_TITLE_DIR, MANIFEST_NAME as CLUSTERED_MANIFEST_NAME, build_title_clustered,
+)
+from redirect_map import (
+    PAGE_DUMP, REDIRECT_DUMP, REDIRECT_MAP_FILE, TITLE_CANONICAL_FILE, CANONICAL_DAILY_DIR,
+    build_redirect_map, build_canonical_daily,
+)
+from catalog import CURRENT_FILE, build_catalog, connect_catalog
+from topic_series import prewarm_trending_topics
+
+# Stage runner for main.py. Every stage lists the paths it reads and writes;
+# after a run the fingerprint (name, size, mtime) of both is stored in the
+# pipeline_stages manifest, and the stage is skipped next time if neither has
+# changed. Inside a stage, aggregate/features still work per dt partition
+# (see partition_manifest), so a changed day only recomputes that day.
+
+MANIFEST_NAME = "pipeline_stages"
+
+
+def _files(paths: list[Path]) -> list[Path]:
+    files = []
+    for path in paths:
+        if path.is_file():
+            files.append(path)
+        elif path.is_dir():
+            files.extend(p for p in path.rglob("*") if p.is_file() and not p.name.endswith(".part"))
+    return files
+
+
+def _fingerprint(paths: list[Path]) -> str:
+    return files_fingerprint(_files(paths))
+
+
+def _outputs_fingerprint(outputs) -> str:
+    # a list of paths, or a callable for outputs that a later stage moves
+    return outputs() if callable(outputs) else _fingerprint(outputs)
+
+
+def _parsed_hours() -> str:
+    # which (dt, hour) pairs are parsed, whichever layout holds them, so
+    # compacting a day doesn't look like process's output changed
+    hours = []
+    for dt, files in hourly_files_by_dt().items():
+        if is_compacted(dt):
+            hours.extend(f"{dt}/{hh:02d}" for hh in range(HOURS_PER_DAY))
+        else:
+            hours.extend(f"{dt}/{p.parent.name[len('hour='):]}" for p in files)
+    return hashlib.sha1("\n".join(sorted(hours)).encode()).hexdigest()
+
+
+def _fetch_inputs(start: date, end: date) -> str | None:
+    # nothing on disk to fingerprint: the stage is current once every hour
+    # of the range is present locally (checked offline). The hourly format
+    # is part of the key, so an upgrade re-runs fetch and process
+    if missing_local_hours(start, end):
+        return None
+    return f"v{HOURLY_FORMAT_VERSION}:{start}..{end}"
+
+
+def _build_redirect_map():
+    # the SQL dumps are several GB and only fetched on request
+    # (redirect_map.download_sql_dumps); without them topics use the API
+    if not PAGE_DUMP.exists() or not REDIRECT_DUMP.exists():
+        print(f"No SQL dumps in {PAGE_DUMP.parent}; redirects will be looked up online")
+        return
+    build_redirect_map()
+
+
+def _prewarm_topics() -> bool:
+    if api_cache.OFFLINE:
+        # nothing can be fetched; the stage key includes the mode, so going
+        # back online runs it again
+        print("Offline (api_cache.OFFLINE): topic pre-resolution skipped")
+        return True
+
+    con = connect_catalog()
+    try:
+        n = prewarm_trending_topics(con)
+        print(f"Resolved {n} trending topic(s) into the API cache")
+        return True
+    except (requests.RequestException, OfflineCacheMiss) as e:
+        # only a cache warm-up; the dashboard resolves on demand, and the
+        # stage stays unrecorded so the next run tries again
+        print(f"Topic pre-resolution failed, will retry next run: {e}")
+        return False
+    finally:
+        con.close()
+
+
+def stages(fused: bool = False, fused_fetch: bool = False, canonical: bool = False) -> list[dict]:
+    """Ordered stage table: name, run(start, end), inputs(start, end), outputs.
+
+    outputs is a list of paths, or a callable returning a fingerprint. A run
+    returning False did not finish and is not recorded.
+
+    `canonical` adds a stage re-keying the daily aggregates onto canonical
+    articles (needs the redirect map).
+    """
+    hourly = [HOURLY_DIR, COMPACTED_ROOT]
+
+    def paths(*p):
+        return lambda start, end: _fingerprint(list(p))
+
+    table = [
+        {
+            "name": "fetch",
+            "run": lambda start, end: fetch_data(start, end, fused=fused_fetch),
+            "inputs": _fetch_inputs,
+            "outputs": [],
+        },
+        {
+            "name": "process",
+            "run": lambda start, end: process_data(start=start, end=end),
+            # the range is part of the key: widening it must re-run the stage
+            "inputs": lambda start, end: f"v{HOURLY_FORMAT_VERSION}:{start}..{end}:{_fingerprint([IN_DIR])}",
+            # not HOURLY_DIR / TITLE_DICT_DIR: compact and canonical rewrite
+            # them, and process would never look up to date again
+            "outputs": _parsed_hours,
+        },
+        {
+            "name": "compact",
+            "run": lambda start, end: compact_hourly(),
+            "inputs": paths(HOURLY_DIR),
+            "outputs": [COMPACTED_ROOT],
+        },
+    ]
+
+    if fused:
+        table.append({
+            "name": "fused",
+            "run": lambda start, end: run_fused_pipeline(),
+            "inputs": paths(*hourly),
+            "outputs": [DAILY_OUT_DIR, TREND_OUT_DIR, TOP_OUT_FILE, TITLE_DICT_DIR],
+        })
+    else:
+        table += [
+            {
+                "name": "aggregate",
+                "run": lambda start, end: aggregate_data(incremental=True),
+                "inputs": paths(*hourly),
+                "outputs": [DAILY_OUT_DIR, TITLE_DICT_DIR],
+            },
+            {
+                "name": "features",
+                "run": lambda start, end: build_features(incremental=True),
+                "inputs": paths(DAILY_OUT_DIR),
+                "outputs": [FEAT_OUT_DIR],
+            },
+            {
+                "name": "trends",
+                "run": lambda start, end: build_trends(),
+                "inputs": paths(FEAT_OUT_DIR, TITLE_DICT_DIR),
+                "outputs": [TREND_OUT_DIR, TOP_OUT_FILE],
+            },
+        ]
+
+    table.append({
+        "name": "redirects",
+        "run": lambda start, end: _build_redirect_map(),
+        "inputs": paths(PAGE_DUMP, REDIRECT_DUMP),
+        "outputs": [REDIRECT_MAP_FILE],
+    })
+    if canonical:
+        table.append({
+            "name": "canonical",
+            "run": lambda start, end: build_canonical_daily(),
+            "inputs": paths(REDIRECT_MAP_FILE, DAILY_OUT_DIR),
+            "outputs": [TITLE_CANONICAL_FILE, CANONICAL_DAILY_DIR, TITLE_DICT_DIR],
+        })
+
+    table += [
+        {
+            "name": "clustered",
+            "run": lambda start, end: build_title_clustered(),
+            # the manifest name carries the layout version: a new layout
+            # must be built even if no input changed
+            "inputs": lambda start, end: (
+                f"{CLUSTERED_MANIFEST_NAME}:{_fingerprint([DAILY_OUT_DIR, TITLE_DICT_DIR, *hourly])}"
+            ),
+            "outputs": [DAILY_BY_TITLE_DIR, HOURLY_BY_TITLE_DIR],
+        },
+        {
+            "name": "catalog",
+            "run": lambda start, end: build_catalog(),
+            "inputs": paths(
+                DAILY_OUT_DIR, TREND_OUT_DIR, TOP_OUT_FILE, TITLE_DICT_DIR,
+                DAILY_BY_TITLE_DIR, HOURLY_BY_TITLE_DIR, *hourly,
+                REDIRECT_MAP_FILE, CANONICAL_DAILY_DIR,
+            ),
+            "outputs": [CURRENT_FILE],
+        },
+        {
+            "name": "topics",
+            "run": lambda start, end: _prewarm_topics(),
+            "inputs": lambda start, end: (
+                f"{'offline' if api_cache.OFFLINE else 'online'}:{_fingerprint([TOP_OUT_FILE])}"
+            ),
+            "outputs": [],
+        },
+    ]
+    return table
+
+
+def run_pipeline(
+    start: date = START_DATE,
+    end: date = END_DATE,
+    only: list[str] | None = None,
+    force: bool = False,
+    fused: bool = False,
+    fused_fetch: bool = False,
+    canonical: bool = False,
+) -> dict[str, str]:
+    """Run the stages in order, skipping those whose inputs and outputs are unchanged.
+
+    `only` restricts the run to the named stages; `force` runs them even if
+    they look up to date. `start` / `end` bound fetch and process. Returns
+    {stage name: "ran" | "skipped" | "incomplete"} for the stages that were selected.
+    """
+    table = stages(fused=fused, fused_fetch=fused_fetch, canonical=canonical)
+    names = [s["name"] for s in table]
+    unknown = sorted(set(only or []) - set(names))
+    if unknown:
+        raise ValueError(f"Unknown stage(s) {unknown}; expected some of {names}")
+
+    manifest = load_manifest(MANIFEST_NAME)
+    t_total = time.perf_counter()
+    outcome = {}
+
+    for stage in table:
+        name = stage["name"]
+        if only and name not in only:
+            continue
+
+        previous = manifest.get(name)
+        inputs = stage["inputs"](start, end)
+        if (
+            not force
+            and inputs is not None
+            and previous is not None
+            and previous["inputs"] == inputs
+            and previous["outputs"] == _outputs_fingerprint(stage["outputs"])
+        ):
+            print(f"[{name}] up to date, skipped")
+            outcome[name] = "skipped"
+            continue
+
+        print(f"[{name}] running...")
+        t0 = time.perf_counter()
+        if stage["run"](start, end) is False:
+            print(f"[{name}] incomplete, not recorded")
+            if manifest.pop(name, None) is not None:
+                save_manifest(MANIFEST_NAME, manifest)
+            outcome[name] = "incomplete"
+            continue
+
+        # fingerprint after the run: a stage may rewrite its own inputs
+        # (compaction removes hourly directories)
+        manifest[name] = {
+            "inputs": stage["inputs"](start, end),
+            "outputs": _outputs_fingerprint(stage["outputs"]),
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        save_manifest(MANIFEST_NAME, manifest)
+        print(f"[{name}] done in {time.perf_counter() - t0:,.1f}s")
+        outcome[name] = "ran"
+
+    print(f"Pipeline finished in {time.perf_counter() - t_total:,.1f}s")
+    return outcome
@@ -1,82 +1,321 @@
 import os
 import re
-import gzip
+from datetime import date
 from pathlib import Path
-import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
 import pyarrow.parquet as pq
 
-IN_DIR = Path("data/raw/gz files/january")
+from decompress import DECOMPRESSOR, open_dump
+from compact_hourly import FORMAT_KEY, HOURLY_FORMAT_VERSION, drop_stale_hourly, is_compacted
+from title_dictionary import update_title_dictionary
+
+IN_DIR = Path("data/raw/gz files")  # <yyyy-mm>/pageviews-*.gz
 OUT_DIR = Path("data/processed/pageviews_hourly")
 
 PROJECTS = {"en", "en.m"} 
 
+MAX_WORKERS = os.cpu_count() or 1
+
+# "lines": pure-Python line loop; "arrow": block-wise pyarrow CSV reader with
+# vectorized filtering (see benchmark_parsers.py)
+PARSER_ENGINE = "lines"
+ARROW_BLOCK_SIZE = 64 * 1024 * 1024  # 64 MB of decompressed text per block
+
 FILENAME_RE = re.compile(r"pageviews-(\d{4})(\d{2})(\d{2})-(\d{2})\d{4}\.gz$")
 
-def parse_one_gz_to_parquet(gz_path: Path, batch_rows: int = 500_000) -> None:
-    m = FILENAME_RE.match(gz_path.name)
+SCHEMA = pa.schema([
+    ("dt", pa.string()),
+    ("hour", pa.int64()),
+    ("project", pa.string()),
+    ("title", pa.string()),
+    ("views", pa.int64()),
+], metadata={FORMAT_KEY: HOURLY_FORMAT_VERSION})
+
+def _batch_table(dt: str, hh: str, projects: list, titles: list, views: list) -> pa.Table:
+    """Build one row group straight from column lists (no pandas round-trip)."""
+    n = len(titles)
+    return pa.Table.from_arrays(
+        [
+            pa.array([dt] * n, pa.string()),
+            pa.array([int(hh)] * n, pa.int64()),
+            pa.array(projects, pa.string()),
+            pa.array(titles, pa.string()),
+            pa.array(views, pa.int64()),
+        ],
+        schema=SCHEMA,
+    )
+
+def _parse_lines(stream, dt: str, hh: str, writer: pq.ParquetWriter, batch_rows: int) -> None:
+    """Line engine over raw bytes: only lines for PROJECTS are split, only kept titles are decoded."""
+    prefixes = tuple(p.encode() + b" " for p in PROJECTS)
+    projects, titles, views_col = [], [], []
+
+    for line in stream:
+        if not line.startswith(prefixes):
+            continue
+
+        parts = line.rstrip(b"\n").split(b" ")
+        if len(parts) < 3:
+            continue
+
+        title = parts[1]
+        try:
+            views = int(parts[2])
+        except ValueError:
+            continue
+
+        if b":" in title and not title.startswith(b"Category:"):
+            continue
+
+        projects.append(parts[0].decode("ascii"))
+        titles.append(title.decode("utf-8", errors="replace"))
+        views_col.append(views)
+
+        # flush one row group at a time to keep memory bounded
+        if len(titles) >= batch_rows:
+            writer.write_table(_batch_table(dt, hh, projects, titles, views_col))
+            projects.clear()
+            titles.clear()
+            views_col.clear()
+
+    if titles:
+        writer.write_table(_batch_table(dt, hh, projects, titles, views_col))
+
+def _decode_titles(titles: pa.Array) -> pa.Array:
+    try:
+        return pc.cast(titles, pa.string())
+    except pa.ArrowInvalid:
+        # rare invalid UTF-8: fall back to the same replacement the line engine uses
+        return pa.array(
+            [t.decode("utf-8", errors="replace") for t in titles.to_pylist()],
+            pa.string(),
+        )
+
+def _iter_blocks(stream, block_size: int):
+    """Yield ~block_size chunks of the stream, each ending on a line boundary."""
+    tail = b""
+    while True:
+        chunk = stream.read(block_size)
+        if not chunk:
+            break
+        block = tail + chunk
+        cut = block.rfind(b"\n") + 1
+        if cut == 0:
+            tail = block
+            continue
+        tail = block[cut:]
+        yield block[:cut]
+    if tail:
+        yield tail
+
+def _filter_arrow_batch(batch: pa.Table) -> tuple[pa.Array, pa.Array, pa.Array]:
+    """Apply the project, views and namespace filters as vectorized column ops."""
+    project = batch.column("project")
+    title = batch.column("title")
+    views = batch.column("views")
+
+    mask = pc.and_(
+        pc.is_in(project, value_set=pa.array([p.encode() for p in PROJECTS], pa.binary())),
+        pc.match_substring_regex(views, r"^[0-9]+$"),
+    )
+    mask = pc.and_(
+        mask,
+        pc.or_(
+            pc.invert(pc.match_substring(title, ":")),
+            pc.starts_with(title, "Category:"),
+        ),
+    )
+
+    project = pc.cast(pc.filter(project, mask), pa.string())
+    title = _decode_titles(pc.filter(title, mask))
+    views = pc.cast(pc.cast(pc.filter(views, mask), pa.string()), pa.int64())
+    return project, title, views
+
+def _parse_arrow(stream, dt: str, hh: str, writer: pq.ParquetWriter, batch_rows: int) -> None:
+    """Columnar engine: read large blocks with pyarrow's CSV reader and filter them vectorized.
+
+    Every column is read as raw bytes so nothing is decoded before filtering;
+    rows that don't have exactly four space-separated fields are skipped.
+    Blocks are cut in Python and handed to read_csv as buffers, so all reads
+    from `stream` (and any decompression error) happen on this thread.
+    """
+    read_opts = pv.ReadOptions(
+        column_names=["project", "title", "views", "bytes"],
+        block_size=ARROW_BLOCK_SIZE,
+    )
+    parse_opts = pv.ParseOptions(
+        delimiter=" ",
+        quote_char=False,
+        escape_char=False,
+        double_quote=False,
+        invalid_row_handler=lambda row: "skip",
+    )
+    convert_opts = pv.ConvertOptions(
+        include_columns=["project", "title", "views"],
+        column_types={"project": pa.binary(), "title": pa.binary(), "views": pa.binary()},
+        strings_can_be_null=False,
+    )
+
+    pending, pending_rows = [], 0
+
+    for block in _iter_blocks(stream, ARROW_BLOCK_SIZE):
+        batch = pv.read_csv(
+            pa.BufferReader(block),
+            read_options=read_opts,
+            parse_options=parse_opts,
+            convert_options=convert_opts,
+        )
+        project, title, views = _filter_arrow_batch(batch)
+        n = len(title)
+        if n == 0:
+            continue
+
+        pending.append(pa.Table.from_arrays(
+            [
+                pa.array([dt] * n, pa.string()),
+                pa.array([int(hh)] * n, pa.int64()),
+                project,
+                title,
+                views,
+            ],
+            schema=SCHEMA,
+        ))
+        pending_rows += n
+
+        if pending_rows >= batch_rows:
+            writer.write_table(pa.concat_tables(pending))
+            pending, pending_rows = [], 0
+
+    if pending:
+        writer.write_table(pa.concat_tables(pending))
+
+PARSERS = {
+    "lines": _parse_lines,
+    "arrow": _parse_arrow,
+}
+
+def hourly_partition(gz_name: str, out_root: Path = OUT_DIR) -> tuple[str, str, Path]:
+    """Map a dump filename to (dt, hour, output parquet path)."""
+    m = FILENAME_RE.match(gz_name)
     if not m:
-        raise ValueError(f"Unexpected filename format: {gz_path.name}")
+        raise ValueError(f"Unexpected filename format: {gz_name}")
 
     yyyy, mm, dd, hh = m.groups()
     dt = f"{yyyy}-{mm}-{dd}"
+    stem = gz_name[: -len(".gz")]
+    return dt, hh, out_root / f"dt={dt}" / f"hour={hh}" / f"part-{stem}.parquet"
+
+def write_dump_to_parquet(
+    open_stream,
+    dt: str,
+    hh: str,
+    out_file: Path,
+    batch_rows: int = 500_000,
+    engine: str = PARSER_ENGINE,
+) -> None:
+    """Parse a decompressed dump into out_file, atomically.
+
+    `open_stream` is a zero-argument callable returning a context manager that
+    yields the decompressed bytes (see decompress.py). out_file only appears
+    once that context has exited cleanly, so a decompressor that reports an
+    error on close (e.g. a truncated dump piped through gzip -dc) leaves
+    nothing behind.
+    """
+    if engine not in PARSERS:
+        raise ValueError(f"Unknown parser engine: {engine!r} (expected one of {sorted(PARSERS)})")
+
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+
+    # write to a temp file first so a crash never leaves a half-written
+    # parquet behind that would be skipped on the next run
+    tmp_file = out_file.with_suffix(out_file.suffix + ".part")
+
+    with pq.ParquetWriter(tmp_file, SCHEMA, compression="zstd") as writer:
+        with open_stream() as stream:
+            PARSERS[engine](stream, dt, hh, writer, batch_rows)
+
+    tmp_file.replace(out_file)
+
+def parse_one_gz_to_parquet(
+    gz_path: Path,
+    batch_rows: int = 500_000,
+    engine: str = PARSER_ENGINE,
+    out_root: Path = OUT_DIR,
+    decompressor: str = DECOMPRESSOR,
+) -> str:
+    dt, hh, out_file = hourly_partition(gz_path.name, out_root)
+
+    # skip if already processed (or already folded into a compacted day;
+    # compaction only exists for the default output root)
+    if out_file.exists() or (out_root == OUT_DIR and is_compacted(dt)):
+        return f"SKIP {gz_path.name}"
 
-    out_dir = OUT_DIR / f"dt={dt}" / f"hour={hh}"
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_file = out_dir / f"part-{gz_path.stem}.parquet"
-
-    # skip if already processed
-    if out_file.exists():
-        return
-
-    rows = []
-    total_kept = 0
-
-    with gzip.open(gz_path, "rt", encoding="utf-8", errors="replace") as f:
-        for line in f:
-            parts = line.rstrip("\n").split(" ")
-            if len(parts) < 3:
-                continue
-
-            project = parts[0]
-            if project not in PROJECTS:
-                continue
-
-            title = parts[1]
-            try:
-                views = int(parts[2])
-            except ValueError:
-                continue
-
-            if ":" in title and not title.startswith("Category:"):
-                continue
-
-            rows.append((dt, int(hh), project, title, views))
-            total_kept += 1
-
-            if len(rows) >= batch_rows:
-                df = pd.DataFrame(rows, columns=["dt", "hour", "project", "title", "views"])
-                table = pa.Table.from_pandas(df, preserve_index=False)
-                pq.write_table(table, out_file, compression="zstd")
-                rows.clear() 
-                break
-
-    if rows:
-        df = pd.DataFrame(rows, columns=["dt", "hour", "project", "title", "views"])
-        table = pa.Table.from_pandas(df, preserve_index=False)
-        pq.write_table(table, out_file, compression="zstd")
-
-    if total_kept == 0 and not out_file.exists():
-        df = pd.DataFrame([], columns=["dt", "hour", "project", "title", "views"])
-        table = pa.Table.from_pandas(df, preserve_index=False)
-        pq.write_table(table, out_file, compression="zstd")
-
-def process_data():
-    gz_files = sorted(IN_DIR.glob("*.gz"))
+    write_dump_to_parquet(
+        lambda: open_dump(gz_path, decompressor), dt, hh, out_file, batch_rows, engine
+    )
+
+    return f"DONE {gz_path.name}"
+
+def _parse_one_safe(gz_path: Path, engine: str = PARSER_ENGINE) -> str:
+    """Worker entry point: never raises, so one bad dump can't kill the pool."""
+    try:
+        return parse_one_gz_to_parquet(gz_path, engine=engine)
+    except Exception as e:
+        return f"FAILED {gz_path.name}: {type(e).__name__}: {e}"
+
+def _in_range(gz_path: Path, start: date | None, end: date | None) -> bool:
+    m = FILENAME_RE.match(gz_path.name)
+    if not m:
+        return True  # reported as a failure by the parser
+    day = date(int(m[1]), int(m[2]), int(m[3]))
+    return (start is None or day >= start) and (end is None or day <= end)
+
+def process_data(
+    workers: int = MAX_WORKERS,
+    engine: str = PARSER_ENGINE,
+    start: date | None = None,
+    end: date | None = None,
+):
+    """Parse every raw .gz dump into an hourly parquet partition.
+
+    With workers > 1 the dumps are parsed in a process pool; a failing file
+    is reported and skipped instead of aborting the whole run. `engine`
+    selects the line parser ("lines" or "arrow"). `start` / `end` limit the
+    run to dumps for those days (inclusive). Output from an older format
+    is dropped first, so those dumps are parsed again.
+    """
+    drop_stale_hourly()
+
+    gz_files = sorted(
+        (p for p in IN_DIR.glob("*/*.gz") if _in_range(p, start, end)),
+        key=lambda p: p.name,
+    )
     print(f"Found {len(gz_files)} gz files")
 
-    for i, gz in enumerate(gz_files, 1):
-        parse_one_gz_to_parquet(gz)
-        if i % 20 == 0:
-            print(f"Processed {i}/{len(gz_files)}")
+    failed = []
+
+    if workers <= 1:
+        results = (_parse_one_safe(gz, engine) for gz in gz_files)
+        for i, msg in enumerate(results, 1):
+            print(f"[{i}/{len(gz_files)}] {msg}")
+            if msg.startswith("FAILED"):
+                failed.append(msg)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_parse_one_safe, gz, engine) for gz in gz_files]
+            for i, fut in enumerate(as_completed(futures), 1):
+                msg = fut.result()
+                print(f"[{i}/{len(gz_files)}] {msg}")
+                if msg.startswith("FAILED"):
+                    failed.append(msg)
+
+    if failed:
+        print(f"{len(failed)} file(s) failed and were skipped:")
+        for msg in failed:
+            print(f"  {msg}")
+
+    update_title_dictionary()
 
@@ -0,0 +1,272 @@
+import re
+import gzip
+import shutil
+from pathlib import Path
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
+
+from title_dictionary import title_dict_source, register_titles
+from create_features import DAILY_GLOB
+
+# Local redirect -> canonical article map built from the enwiki SQL dumps
+# (https://dumps.wikimedia.org/enwiki/latest/):
+#
+#   page.sql.gz      page_id, page_namespace, page_title, page_is_redirect, ...
+#   redirect.sql.gz  rd_from (page_id of the redirect), rd_namespace, rd_title, ...
+#
+# Only main-namespace, same-wiki redirects are kept, and double redirects are
+# followed for up to MAX_HOPS hops. The result lets topic lookups find every
+# redirect of an article with a local join instead of live API queries, and
+# optionally re-keys the daily aggregates onto canonical articles.
+
+SQL_DUMP_URL = "https://dumps.wikimedia.org/enwiki/latest/"
+SQL_DUMP_DIR = Path("data/raw/sql")
+PAGE_DUMP = SQL_DUMP_DIR / "enwiki-latest-page.sql.gz"
+REDIRECT_DUMP = SQL_DUMP_DIR / "enwiki-latest-redirect.sql.gz"
+
+REDIRECT_MAP_DIR = Path("data/processed/redirect_map")
+REDIRECT_MAP_FILE = REDIRECT_MAP_DIR / "redirect_map.parquet"      # redirect_title, canonical_title
+TITLE_CANONICAL_FILE = REDIRECT_MAP_DIR / "title_canonical.parquet"  # title_id, canonical_id
+
+CANONICAL_DAILY_DIR = Path("data/aggregates/pageviews_daily_canonical")
+
+MAX_HOPS = 2
+BATCH_ROWS = 500_000
+CHUNK_SIZE = 1024 * 1024
+
+# one field of an extended INSERT tuple: a quoted string (group 1), NULL
+# (group 2) or a bare number (group 3). Matched anchored at the current
+# position, so a "),(" inside a quoted title can never start a new tuple.
+_FIELD = re.compile(r"'((?:[^'\\]|\\.)*)'|(NULL)|([-+.\deE]+)")
+_ESCAPES = {"0": "\0", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+_ESCAPE_RE = re.compile(r"\\(.)")
+
+
+def _unescape(s: str) -> str:
+    if "\\" not in s:
+        return s
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES.get(m[1], m[1]), s)
+
+
+def _parse_values(line: str, pos: int) -> list[list[str | None]]:
+    """Tuples of the VALUES list starting at `pos`.
+
+    Strings come back unescaped, NULL as None and numbers as their text.
+    Raises ValueError at the first character that doesn't fit the grammar.
+    """
+    rows = []
+    n = len(line)
+    while True:
+        if line.startswith("(", pos):
+            pos += 1
+        else:
+            raise ValueError(f"expected '(' at offset {pos}")
+        row = []
+        while True:
+            m = _FIELD.match(line, pos)
+            if m is None:
+                raise ValueError(f"bad field at offset {pos}")
+            s, null, num = m.groups()
+            row.append(_unescape(s) if s is not None else None if null else num)
+            pos = m.end()
+            sep = line[pos] if pos < n else ""
+            pos += 1
+            if sep == ")":
+                break
+            if sep != ",":
+                raise ValueError(f"expected ',' or ')' at offset {pos - 1}")
+        rows.append(row)
+        sep = line[pos] if pos < n else ""
+        pos += 1
+        if sep == ";" or sep == "":
+            return rows
+        if sep != ",":
+            raise ValueError(f"expected ',' or ';' at offset {pos - 1}")
+
+
+def _insert_rows(path: Path, table: str):
+    """Yield every row (a list of field values) in `INSERT INTO <table>` lines.
+
+    A line that doesn't parse is skipped whole and reported, rather than
+    losing rows silently.
+    """
+    prefix = f"INSERT INTO `{table}` VALUES "
+    bad = 0
+    with gzip.open(path, "rb") as f:
+        for line in f:
+            if not line.startswith(prefix.encode()):
+                continue
+            text = line.decode("utf-8", errors="replace").rstrip("\r\n")
+            try:
+                rows = _parse_values(text, len(prefix))
+            except ValueError as e:
+                bad += 1
+                print(f"{path.name}: skipped malformed INSERT line ({e})")
+                continue
+            yield from rows
+    if bad:
+        print(f"{path.name}: {bad:,} INSERT line(s) could not be parsed")
+
+
+def _write_batches(rows, schema: pa.Schema, out_file: Path) -> int:
+    """Write tuples matching `schema` to out_file, BATCH_ROWS at a time."""
+    def flush(batch):
+        columns = [pa.array(col, type=f.type) for col, f in zip(zip(*batch), schema)]
+        writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+
+    n = 0
+    with pq.ParquetWriter(out_file, schema, compression="zstd") as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= BATCH_ROWS:
+                flush(batch)
+                n += len(batch)
+                batch = []
+        if batch:
+            flush(batch)
+            n += len(batch)
+    return n
+
+
+def download_sql_dumps():
+    """Fetch page.sql.gz and redirect.sql.gz (several GB) if not present."""
+    SQL_DUMP_DIR.mkdir(parents=True, exist_ok=True)
+    for path in (PAGE_DUMP, REDIRECT_DUMP):
+        if path.exists():
+            continue
+        tmp = path.with_suffix(path.suffix + ".part")
+        with requests.get(SQL_DUMP_URL + path.name, stream=True, timeout=120) as r:
+            r.raise_for_status()
+            with open(tmp, "wb") as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+        tmp.replace(path)
+        print("Downloaded", path)
+
+
+def build_redirect_map(page_dump: Path = PAGE_DUMP, redirect_dump: Path = REDIRECT_DUMP):
+    """Parse the SQL dumps into REDIRECT_MAP_FILE (redirect_title, canonical_title)."""
+    if not page_dump.exists() or not redirect_dump.exists():
+        raise RuntimeError(f"Missing {page_dump} / {redirect_dump}. Run download_sql_dumps() first.")
+
+    REDIRECT_MAP_DIR.mkdir(parents=True, exist_ok=True)
+    stage_dir = REDIRECT_MAP_DIR / "_staging"
+    stage_dir.mkdir(exist_ok=True)
+    pages_file = stage_dir / "pages.parquet"
+    redirects_file = stage_dir / "redirects.parquet"
+
+    # the page dump only supplies the titles of main-namespace redirect pages
+    # (page_id, page_namespace, page_title, page_is_redirect, ...)
+    n_pages = _write_batches(
+        (
+            (int(row[0]), row[2])
+            for row in _insert_rows(page_dump, "page")
+            if row[1] == "0" and row[3] == "1"
+        ),
+        pa.schema([("page_id", pa.int64()), ("title", pa.string())]),
+        pages_file,
+    )
+    # (rd_from, rd_namespace, rd_title, rd_interwiki, ...); rd_interwiki is
+    # NULL or '' for same-wiki redirects
+    n_redirects = _write_batches(
+        (
+            (int(row[0]), row[2])
+            for row in _insert_rows(redirect_dump, "redirect")
+            if row[1] == "0" and not row[3]
+        ),
+        pa.schema([("rd_from", pa.int64()), ("target", pa.string())]),
+        redirects_file,
+    )
+    print(f"Parsed {n_pages:,} redirect page(s) and {n_redirects:,} redirect target(s)")
+
+    con = duckdb.connect()
+    con.execute(f"""
+        CREATE TEMP TABLE hop AS
+        SELECT p.title AS redirect_title, r.target AS canonical_title
+        FROM read_parquet('{redirects_file.as_posix()}') r
+        JOIN read_parquet('{pages_file.as_posix()}') p
+          ON p.page_id = r.rd_from
+    """)
+
+    # follow double redirects: A -> B -> C becomes A -> C
+    for _ in range(MAX_HOPS - 1):
+        con.execute("""
+            CREATE OR REPLACE TEMP TABLE hop AS
+            SELECT a.redirect_title, COALESCE(b.canonical_title, a.canonical_title) AS canonical_title
+            FROM hop a
+            LEFT JOIN hop b ON b.redirect_title = a.canonical_title
+        """)
+
+    tmp_file = REDIRECT_MAP_FILE.with_suffix(".parquet.part")
+    con.execute(f"""
+        COPY (
+            SELECT redirect_title, canonical_title
+            FROM hop
+            WHERE redirect_title <> canonical_title
+            ORDER BY canonical_title, redirect_title
+        )
+        TO '{tmp_file.as_posix()}'
+        (FORMAT PARQUET, COMPRESSION ZSTD);
+    """)
+    con.close()
+    tmp_file.replace(REDIRECT_MAP_FILE)
+    shutil.rmtree(stage_dir, ignore_errors=True)
+    print("Redirect map written to:", REDIRECT_MAP_FILE)
+
+
+def build_canonical_daily():
+    """Re-key pageviews_daily onto canonical articles.
+
+    Writes TITLE_CANONICAL_FILE (title_id -> canonical_id, redirects only)
+    and pageviews_daily_canonical, where a redirect's views are added to its
+    target article. Canonical titles without views of their own are added
+    to the title dictionary first.
+    """
+    if not REDIRECT_MAP_FILE.exists():
+        raise RuntimeError("No redirect map found. Run build_redirect_map() first.")
+
+    con = duckdb.connect()
+    redirect_map = f"read_parquet('{REDIRECT_MAP_FILE.as_posix()}')"
+
+    # only canonical titles some viewed redirect points at need an id
+    register_titles(con, f"""(
+        SELECT DISTINCT m.canonical_title AS title
+        FROM {redirect_map} m
+        JOIN {title_dict_source()} d ON d.title = m.redirect_title
+    )""")
+
+    dict_src = title_dict_source()
+    tmp_file = TITLE_CANONICAL_FILE.with_suffix(".parquet.part")
+    con.execute(f"""
+        COPY (
+            SELECT r.title_id, c.title_id AS canonical_id
+            FROM {redirect_map} m
+            JOIN {dict_src} r ON r.title = m.redirect_title
+            JOIN {dict_src} c ON c.title = m.canonical_title
+            ORDER BY r.title_id
+        )
+        TO '{tmp_file.as_posix()}'
+        (FORMAT PARQUET, COMPRESSION ZSTD);
+    """)
+    tmp_file.replace(TITLE_CANONICAL_FILE)
+
+    con.execute(f"""
+        COPY (
+            SELECT
+                d.dt,
+                d.project,
+                COALESCE(c.canonical_id, d.title_id) AS title_id,
+                SUM(d.views) AS views
+            FROM read_parquet('{DAILY_GLOB}') d
+            LEFT JOIN read_parquet('{TITLE_CANONICAL_FILE.as_posix()}') c USING (title_id)
+            GROUP BY ALL
+        )
+        TO '{CANONICAL_DAILY_DIR.as_posix()}'
+        (FORMAT PARQUET, PARTITION_BY (dt), COMPRESSION ZSTD, OVERWRITE 1);
+    """)
+    con.close()
+    print("Canonical daily aggregates written to:", CANONICAL_DAILY_DIR)
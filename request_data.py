@@ -1,24 +1,164 @@
 import time
 import random
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
 from pathlib import Path
 from urllib.parse import urljoin
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 
+from decompress import open_gz_stream
+from dump_integrity import (
+    MD5SUMS_NAME,
+    ChecksumMismatch,
+    HashingReader,
+    VerifiedManifest,
+    md5_file,
+    parse_md5sums,
+    quarantine,
+)
+from process_data import FILENAME_RE, OUT_DIR as HOURLY_DIR, hourly_partition, write_dump_to_parquet
+from compact_hourly import drop_stale_hourly, is_compacted
 
-BASE_URL = "https://dumps.wikimedia.org/other/pageviews/2026/2026-01/"
-OUT_DIR = Path("data/raw/gz files/january")
+
+DUMPS_ROOT = "https://dumps.wikimedia.org/other/pageviews/"
+OUT_DIR = Path("data/raw/gz files")  # one <yyyy-mm> subdirectory per month
+
+# default ingest window, both ends inclusive
+START_DATE = date(2026, 1, 1)
+END_DATE = date(2026, 1, 31)
 
 MAX_WORKERS = 6
 CHUNK_SIZE = 1024 * 1024  # 1 MB
 MAX_RETRIES = 8
+RETRY_STATUS = (429, 502, 503, 504)
+
+# on a 429 every download thread pauses and the number of concurrent
+# requests is halved; it grows back by one after a run of successes
+ADAPTIVE_CONCURRENCY = True
+THROTTLE_PAUSE_S = 30  # used when a 429 carries no Retry-After
+
+# check every dump against the md5sums.txt published next to it
+VERIFY_CHECKSUMS = True
+
+# "threads": blocking requests in a MAX_WORKERS thread pool
+# "async": asyncio + aiohttp, many more transfers in flight (async_fetch.py)
+FETCH_ENGINE = "threads"
+
+# fused mode parses while downloading; the arrow engine releases the GIL for
+# most of its work, so it scales across download threads
+FUSED_ENGINE = "arrow"
+
+
+class _ConcurrencyLimiter:
+    """Cap on in-flight requests shared by all download threads."""
+
+    def __init__(self, limit: int, adaptive: bool):
+        self.max_limit = limit
+        self.limit = limit
+        self.adaptive = adaptive
+        self.active = 0
+        self.successes = 0
+        self.paused_until = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while True:
+                wait = self.paused_until - time.monotonic()
+                if wait <= 0 and self.active < self.limit:
+                    break
+                self.cond.wait(timeout=wait if wait > 0 else None)
+            self.active += 1
+
+    def release(self, ok: bool, throttled: bool = False, retry_after: float | None = None):
+        """Free a slot. Only `ok` (a fully downloaded body) counts towards
+        growing the limit; other failures leave the limit and streak alone."""
+        with self.cond:
+            self.active -= 1
+            if self.adaptive and throttled:
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+                pause = retry_after if retry_after is not None else THROTTLE_PAUSE_S
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+                print(f"Throttled (429): pausing {pause:.0f}s, concurrency -> {self.limit}")
+            elif ok:
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self.successes = 0
+            self.cond.notify_all()
+
+
+def _make_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# one pooled session and limiter for all download threads
+_session = _make_session(MAX_WORKERS)
+_limiter = _ConcurrencyLimiter(MAX_WORKERS, ADAPTIVE_CONCURRENCY)
+_verified = VerifiedManifest()
+
+
+def _retry_after(r: requests.Response) -> float | None:
+    try:
+        return float(r.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+@contextmanager
+def _get_stream(url: str, headers: dict | None = None):
+    """Streaming GET holding a limiter slot until the body is consumed.
+
+    Yields (response, done); the caller calls done() once the whole body
+    has been read, which is the only outcome the limiter counts as a
+    success. Raises HTTPError for RETRY_STATUS responses; other statuses
+    are left to the caller.
+    """
+    state = {"ok": False}
+    throttled, retry_after = False, None
+
+    def done():
+        state["ok"] = True
+
+    _limiter.acquire()
+    try:
+        with _session.get(url, stream=True, timeout=120, headers=headers) as r:
+            if r.status_code in RETRY_STATUS:
+                throttled = r.status_code == 429
+                retry_after = _retry_after(r)
+                raise requests.HTTPError(f"{r.status_code} transient error", response=r)
+            yield r, done
+    finally:
+        _limiter.release(state["ok"], throttled, retry_after)
+
+
+def _retry_sleep(attempt: int, e: Exception):
+    """Back off before the next attempt, or re-raise non-transient errors."""
+    code = getattr(getattr(e, "response", None), "status_code", None)
+    if isinstance(e, requests.HTTPError) and code not in RETRY_STATUS:
+        raise e
+    if code == 429 and _limiter.adaptive:
+        # the limiter already holds every thread back
+        time.sleep(random.random())
+        return
+    time.sleep(min(60, 2 ** (attempt - 1)) + random.random())
 
 
 def list_gz_urls(base_url: str) -> list[str]:
     """List all .gz URLs from the Wikimedia pageviews directory."""
-    resp = requests.get(base_url, timeout=60)
+    resp = _session.get(base_url, timeout=60)
     resp.raise_for_status()
 
     soup = BeautifulSoup(resp.text, "html.parser")
@@ -31,55 +171,312 @@ def list_gz_urls(base_url: str) -> list[str]:
     return sorted(urls)
 
 
-def download_one(url: str) -> str:
-    """Download one .gz file with retries and atomic write."""
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
+def month_url(year: int, month: int, dumps_root: str = DUMPS_ROOT) -> str:
+    return f"{dumps_root}{year}/{year}-{month:02d}/"
+
+
+def fetch_md5sums(base_url: str) -> dict[str, str]:
+    """{filename: md5} for a dump directory; empty if none is published."""
+    resp = _session.get(urljoin(base_url, MD5SUMS_NAME), timeout=60)
+    if resp.status_code == 404:
+        return {}
+    resp.raise_for_status()
+    return parse_md5sums(resp.text)
+
+
+def raw_path(filename: str) -> Path:
+    """Where download_one stores a dump: OUT_DIR/<yyyy-mm>/<filename>."""
+    dt, _, _ = hourly_partition(filename)
+    return OUT_DIR / dt[:7] / filename
+
+
+def months_between(start: date, end: date) -> list[tuple[int, int]]:
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def expected_hours(start: date, end: date) -> list[tuple[str, str]]:
+    """Every (dt, hour) in [start, end], in order."""
+    hours = []
+    day = start
+    while day <= end:
+        hours.extend((day.isoformat(), f"{hh:02d}") for hh in range(24))
+        day += timedelta(days=1)
+    return hours
+
+
+def is_ingested(filename: str) -> bool:
+    dt, _, out_file = hourly_partition(filename)
+    return out_file.exists() or is_compacted(dt)
+
+
+def missing_local_hours(start: date = START_DATE, end: date = END_DATE) -> list[tuple[str, str]]:
+    """(dt, hour) in [start, end] with neither a raw dump nor parsed output on disk.
+
+    Works offline, so callers can tell a range is complete without listing
+    the dump directories.
+    """
+    present = set()
+    for year, month in months_between(start, end):
+        for p in (OUT_DIR / f"{year}-{month:02d}").glob("pageviews-*.gz"):
+            if FILENAME_RE.match(p.name):
+                present.add(hourly_partition(p.name)[:2])
+
+    missing = []
+    parsed_days = {}
+    for dt, hh in expected_hours(start, end):
+        if (dt, hh) in present or is_compacted(dt):
+            continue
+        if dt not in parsed_days:
+            day_dir = HOURLY_DIR / f"dt={dt}"
+            parsed_days[dt] = {p.parent.name[len("hour="):] for p in day_dir.glob("hour=*/part-*.parquet")}
+        if hh not in parsed_days[dt]:
+            missing.append((dt, hh))
+    return missing
+
+
+def _is_downloaded(path: Path, md5: str | None) -> bool:
+    if md5 is None:
+        return path.exists() and path.stat().st_size > 0
+    return _verified.is_verified(path, md5)
+
+
+def plan_hours(
+    start: date = START_DATE,
+    end: date = END_DATE,
+    fused: bool = False,
+    verify: bool = VERIFY_CHECKSUMS,
+    dumps_root: str = DUMPS_ROOT,
+) -> list[tuple[str, str | None]]:
+    """(url, expected md5) of the dumps in [start, end] that still need fetching.
 
+    Lists one dump directory per month, matches the published files against
+    the expected hours, and drops hours that are already parsed (or, unless
+    fused, already downloaded and verified). Hours not published yet are
+    reported and left for a later run. The md5 is None when verify is off
+    or the month has no md5sums file. `dumps_root` can point at a local
+    HTTP server mirroring the <yyyy>/<yyyy-mm>/ layout.
+    """
+    if end < start:
+        raise ValueError(f"end date {end} is before start date {start}")
+
+    wanted = set(expected_hours(start, end))
+    urls, skipped, missing = [], 0, []
+
+    for year, month in months_between(start, end):
+        base_url = month_url(year, month, dumps_root)
+        try:
+            listing = list_gz_urls(base_url)
+        except requests.HTTPError as e:
+            if getattr(e.response, "status_code", None) != 404:
+                raise
+            listing = []  # month not published yet
+
+        sums = fetch_md5sums(base_url) if verify and listing else {}
+
+        published = {}
+        for url in listing:
+            filename = url.split("/")[-1]
+            if FILENAME_RE.match(filename):
+                dt, hh, _ = hourly_partition(filename)
+                published[(dt, hh)] = url
+
+        month_hours = sorted(k for k in wanted if k[0][:7] == f"{year}-{month:02d}")
+        for key in month_hours:
+            url = published.get(key)
+            if url is None:
+                missing.append(key)
+                continue
+            filename = url.split("/")[-1]
+            md5 = sums.get(filename)
+            if is_ingested(filename) or (not fused and _is_downloaded(raw_path(filename), md5)):
+                skipped += 1
+                continue
+            urls.append((url, md5))
+
+    print(
+        f"Planned {len(urls)} of {len(wanted)} hour(s) from {start} to {end} "
+        f"({skipped} already present, {len(missing)} not published)"
+    )
+    if missing:
+        print(f"  first missing hour: {missing[0][0]} {missing[0][1]}:00")
+    return urls
+
+
+def download_one(url: str, md5: str | None = None) -> str:
+    """Download one .gz file with retries and atomic write.
+
+    A leftover .part file (from a failed attempt or an earlier run) is
+    resumed with a Range request instead of being fetched from byte zero.
+    With `md5` the body is hashed as it is written; a mismatch moves the
+    file to the quarantine directory and fetches it again.
+    """
     filename = url.split("/")[-1]
-    out_path = OUT_DIR / filename
+    out_path = raw_path(filename)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
     tmp_path = out_path.with_suffix(out_path.suffix + ".part")
 
-    # Idempotent: skip already-downloaded files
-    if out_path.exists() and out_path.stat().st_size > 0:
+    # Idempotent: skip already-downloaded (and verified) files
+    if _verified.check(out_path, md5):
         return f"SKIP {filename}"
 
-    session = requests.Session()
-
     for attempt in range(1, MAX_RETRIES + 1):
+        offset = tmp_path.stat().st_size if tmp_path.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+
         try:
-            with session.get(url, stream=True, timeout=120) as r:
-                if r.status_code in (429, 502, 503, 504):
-                    raise requests.HTTPError(
-                        f"{r.status_code} transient error", response=r
-                    )
+            with _get_stream(url, headers) as (r, done):
+                if r.status_code == 416:
+                    # .part is longer than the published file; start over
+                    tmp_path.unlink(missing_ok=True)
+                    continue
 
                 r.raise_for_status()
 
-                with open(tmp_path, "wb") as f:
+                resumed = r.status_code == 206
+                if resumed and not r.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+                    tmp_path.unlink(missing_ok=True)
+                    continue
+
+                # a 200 means the server ignored the Range header; on a
+                # resume only the existing prefix is re-read for the hash
+                h = md5_file(tmp_path) if resumed else hashlib.md5()
+                with open(tmp_path, "ab" if resumed else "wb") as f:
                     for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
                         if chunk:
                             f.write(chunk)
+                            h.update(chunk)
+                done()
+
+            if md5 is not None and h.hexdigest() != md5:
+                raise ChecksumMismatch(f"{filename}: expected md5 {md5}, got {h.hexdigest()}")
 
             tmp_path.replace(out_path)
+            if md5 is not None:
+                _verified.record(out_path, md5)
             return f"DONE {filename}"
 
-        except (requests.Timeout, requests.ConnectionError, requests.HTTPError) as e:
-            code = getattr(getattr(e, "response", None), "status_code", None)
-            if isinstance(e, requests.HTTPError) and code not in (429, 502, 503, 504):
-                raise
+        except ChecksumMismatch as e:
+            print(f"{e}; quarantined: {quarantine(tmp_path)}")
+
+        except (
+            requests.Timeout,
+            requests.ConnectionError,
+            requests.HTTPError,
+            requests.exceptions.ChunkedEncodingError,  # body cut short; resume next time
+        ) as e:
+            _retry_sleep(attempt, e)
+
+    raise RuntimeError(f"FAILED after {MAX_RETRIES} retries: {filename}")
+
+
+@contextmanager
+def _verified_gz_stream(raw, md5: str | None, filename: str):
+    """open_gz_stream over `raw` that raises on close if the md5 is off."""
+    reader = HashingReader(raw)
+    with open_gz_stream(reader) as f:
+        yield f
+    reader.drain()
+    if md5 is not None and reader.md5.hexdigest() != md5:
+        raise ChecksumMismatch(f"{filename}: expected md5 {md5}, got {reader.md5.hexdigest()}")
 
-            sleep_s = min(60, 2 ** (attempt - 1)) + random.random()
-            time.sleep(sleep_s)
+
+def download_to_parquet(url: str, md5: str | None = None, engine: str = FUSED_ENGINE) -> str:
+    """Stream one dump straight into its hourly parquet partition.
+
+    The HTTP body is decompressed, filtered to process_data.PROJECTS and
+    written as it arrives; the raw .gz never touches the disk. With `md5`
+    the compressed body is hashed in flight and the partition is only
+    published if it matches.
+    """
+    filename = url.split("/")[-1]
+    dt, hh, out_file = hourly_partition(filename)
+
+    # Idempotent: skip hours that are already parsed or compacted
+    if out_file.exists() or is_compacted(dt):
+        return f"SKIP {filename}"
+
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            with _get_stream(url) as (r, done):
+                r.raise_for_status()
+                r.raw.decode_content = False
+
+                write_dump_to_parquet(
+                    lambda: _verified_gz_stream(r.raw, md5, filename),
+                    dt, hh, out_file, engine=engine,
+                )
+                done()
+
+            return f"DONE {filename}"
+
+        except ChecksumMismatch as e:
+            print(f"{e}; retrying")
+
+        except (
+            requests.Timeout,
+            requests.ConnectionError,
+            requests.HTTPError,
+            urllib3.exceptions.HTTPError,  # connection dropped mid-body
+            EOFError,  # body ended before the gzip stream did
+        ) as e:
+            _retry_sleep(attempt, e)
 
     raise RuntimeError(f"FAILED after {MAX_RETRIES} retries: {filename}")
 
 
-def fetch_data():
-    """Fetch all pageview .gz files, skipping those already present."""
-    urls = list_gz_urls(BASE_URL)
-    print(f"Found {len(urls)} files")
+def fetch_data(
+    start: date = START_DATE,
+    end: date = END_DATE,
+    fused: bool = False,
+    adaptive: bool = ADAPTIVE_CONCURRENCY,
+    engine: str = FETCH_ENGINE,
+    dumps_root: str = DUMPS_ROOT,
+):
+    """Fetch the pageview dumps for every hour in [start, end] not yet present.
+
+    With fused=True each dump is parsed to parquet while it downloads
+    (download_to_parquet) instead of being stored under OUT_DIR. With
+    adaptive=True a 429 from the server slows down all threads at once.
+    engine="async" downloads on an asyncio event loop instead of threads.
+    `dumps_root` is passed to plan_hours; the download workers follow the
+    planned URLs, so a local mirror serves the whole fetch.
+    """
+    if engine not in ("threads", "async"):
+        raise ValueError(f"Unknown fetch engine: {engine!r} (expected 'threads' or 'async')")
+    if engine == "async" and fused:
+        raise ValueError("The async engine only downloads raw dumps; use fused=False")
+
+    # hours parsed by an older format count as missing (and are refetched
+    # in fused mode, where no raw dump is kept)
+    drop_stale_hourly()
+
+    global _limiter, _verified
+    _limiter = _ConcurrencyLimiter(MAX_WORKERS, adaptive)
+    _verified = VerifiedManifest()
+
+    planned = plan_hours(start, end, fused=fused, dumps_root=dumps_root)
+
+    if engine == "async":
+        # imported here: async_fetch builds on this module and needs aiohttp
+        from async_fetch import fetch_async
+
+        try:
+            fetch_async(planned, _verified)
+        finally:
+            _verified.save()
+        return
+
+    worker = download_to_parquet if fused else download_one
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
-        futures = [pool.submit(download_one, url) for url in urls]
-        for fut in as_completed(futures):
-            print(fut.result())
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            futures = [pool.submit(worker, url, md5) for url, md5 in planned]
+            for fut in as_completed(futures):
+                print(fut.result())
+    finally:
+        _verified.save()
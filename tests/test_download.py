@@ -0,0 +1,167 @@
+import gzip
+import random
+import hashlib
+import threading
+import types
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("bs4")
+pytest.importorskip("pyarrow")
+
+DUMP_NAME = "pageviews-20260101-000000.gz"
+
+
+def _sample_dump(n_titles: int = 20_000) -> bytes:
+    rng = random.Random(0)
+    lines = []
+    for i in range(n_titles):
+        lines.append(f"en Title_{i}_{rng.random():.12f} {rng.randint(1, 900)} 0\n")
+        lines.append(f"en.m Title_{i} {rng.randint(1, 90)} 0\n")
+        if i % 50 == 0:
+            lines.append(f"de Titel_{i} 3 0\nen Talk:Page_{i} 4 0\n")
+    # level 0 keeps the body large and the cut points deterministic
+    return gzip.compress("".join(lines).encode(), compresslevel=0)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        srv = self.server
+        srv.requests.append((self.path, self.headers.get("Range")))
+
+        if self.path.endswith("/"):
+            names = [p.rsplit("/", 1)[1] for p in srv.files if p.rsplit("/", 1)[0] + "/" == self.path]
+            if not names:
+                return self._status(404)
+            body = "".join(f'<a href="{n}">{n}</a>\n' for n in names).encode()
+            return self._send(200, body, {"Content-Type": "text/html"})
+
+        faults = srv.faults.get(self.path)
+        action = faults.pop(0) if faults else None
+        if action == "503":
+            return self._status(503)
+        if action == "429":
+            return self._status(429, {"Retry-After": "0"})
+
+        data = srv.files.get(self.path)
+        if data is None:
+            return self._status(404)
+
+        start = 0
+        rng = self.headers.get("Range")
+        if rng and action != "cut":
+            start = int(rng[len("bytes="):].split("-")[0])
+            if start >= len(data):
+                return self._status(416)
+            headers = {"Content-Range": f"bytes {start}-{len(data) - 1}/{len(data)}"}
+            return self._send(206, data[start:], headers)
+
+        if action == "cut":
+            # promise the whole body, send half of it, drop the connection
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data[: len(data) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        return self._send(200, data)
+
+    def _status(self, code: int, headers: dict | None = None):
+        self._send(code, b"", headers)
+
+    def _send(self, code: int, body: bytes, headers: dict | None = None):
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.files, srv.faults, srv.requests = {}, {}, []
+    srv.root = f"http://127.0.0.1:{srv.server_port}/"
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def request_data(tmp_path, monkeypatch):
+    # the pipeline writes under relative data/ paths
+    monkeypatch.chdir(tmp_path)
+    import request_data
+    from dump_integrity import VerifiedManifest
+
+    monkeypatch.setattr(request_data, "_verified", VerifiedManifest())
+    monkeypatch.setattr(request_data, "_limiter", request_data._ConcurrencyLimiter(4, True))
+    # small chunks, so a cut body leaves a partial .part behind to resume
+    monkeypatch.setattr(request_data, "CHUNK_SIZE", 16 * 1024)
+    # no real backoff between retries
+    monkeypatch.setattr(request_data, "time", types.SimpleNamespace(monotonic=time.monotonic, sleep=lambda s: None))
+    return request_data
+
+
+def test_download_one_survives_faults_and_resumes(server, request_data):
+    data = _sample_dump()
+    path = f"/2026/2026-01/{DUMP_NAME}"
+    server.files[path] = data
+    server.faults[path] = ["503", "429", "cut"]
+    md5 = hashlib.md5(data).hexdigest()
+
+    assert request_data.download_one(server.root + path[1:], md5) == f"DONE {DUMP_NAME}"
+
+    out = request_data.raw_path(DUMP_NAME)
+    assert out.read_bytes() == data
+    assert request_data._verified.is_verified(out, md5)
+
+    ranges = [r for p, r in server.requests if p == path]
+    assert ranges[:3] == [None, None, None]
+    # the cut left a partial .part; the next attempt resumed it
+    assert ranges[3] is not None and int(ranges[3][len("bytes="):].rstrip("-")) > 0
+    # the 429 halved the limit to 2; only the completed body counts towards
+    # growing it (had the cut counted too, it would be back at 3)
+    assert request_data._limiter.limit == 2
+
+
+def test_fused_fetch_matches_parse_and_never_publishes_a_truncated_dump(server, request_data, tmp_path, monkeypatch):
+    import pyarrow.parquet as pq
+    from datetime import date
+    from process_data import hourly_partition, parse_one_gz_to_parquet
+
+    good, cut = DUMP_NAME, "pageviews-20260101-010000.gz"
+    data = _sample_dump()
+    month = "/2026/2026-01/"
+    server.files[month + good] = data
+    server.files[month + cut] = data
+    server.files[month + "md5sums.txt"] = f"{hashlib.md5(data).hexdigest()}  {good}\n".encode()
+    server.faults[month + cut] = ["cut", "cut"]
+    monkeypatch.setattr(request_data, "MAX_RETRIES", 2)
+
+    with pytest.raises(RuntimeError, match=cut):
+        request_data.fetch_data(date(2026, 1, 1), date(2026, 1, 1), fused=True, dumps_root=server.root)
+
+    # the truncated dump left no partition behind, and no raw file was kept
+    assert not hourly_partition(cut)[2].exists()
+    assert not request_data.raw_path(good).exists()
+
+    gz_path = tmp_path / good
+    gz_path.write_bytes(data)
+    parse_one_gz_to_parquet(gz_path, out_root=tmp_path / "reference")
+
+    def rows(path):
+        return pq.read_table(path).sort_by([("project", "ascending"), ("title", "ascending")]).to_pylist()
+
+    fused = rows(hourly_partition(good)[2])
+    assert fused and fused == rows(hourly_partition(good, tmp_path / "reference")[2])
@@ -0,0 +1,51 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("duckdb")
+pq = pytest.importorskip("pyarrow.parquet")
+
+DATA = Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def redirect_map(tmp_path, monkeypatch):
+    # the pipeline writes under relative data/ paths
+    monkeypatch.chdir(tmp_path)
+    import redirect_map
+
+    for name in ("page.sql.gz", "redirect.sql.gz"):
+        shutil.copy(DATA / name, tmp_path / name)
+    return redirect_map
+
+
+def _read_map(module) -> dict[str, str]:
+    table = pq.read_table(module.REDIRECT_MAP_FILE).to_pylist()
+    return {row["redirect_title"]: row["canonical_title"] for row in table}
+
+
+def test_build_redirect_map(redirect_map, tmp_path):
+    redirect_map.build_redirect_map(tmp_path / "page.sql.gz", tmp_path / "redirect.sql.gz")
+
+    assert _read_map(redirect_map) == {
+        "Old_Name": "Canonical_Article",
+        # double redirect Older_Name -> Old_Name -> Canonical_Article
+        "Older_Name": "Canonical_Article",
+        # "),(" inside a quoted title must not split the tuple
+        "Odd),(Title": "Canonical_Article",
+        "O'Brien_redirect": "O'Brien",
+    }
+    # Talk_redirect (namespace 1), Interwiki_redirect (rd_interwiki 'fr')
+    # and Project_redirect (target in namespace 4) are dropped
+    assert not (redirect_map.REDIRECT_MAP_DIR / "_staging").exists()
+
+
+def test_parse_values_accepts_null_and_rejects_garbage(redirect_map):
+    line = "VALUES (1,0,'a\\'b',NULL,-2.5),(2,4,'),(',NULL,'');"
+    assert redirect_map._parse_values(line, len("VALUES ")) == [
+        ["1", "0", "a'b", None, "-2.5"],
+        ["2", "4", "),(", None, ""],
+    ]
+    with pytest.raises(ValueError):
+        redirect_map._parse_values("VALUES (1,0,'unterminated);", len("VALUES "))
@@ -0,0 +1,93 @@
+import shutil
+from pathlib import Path
+import duckdb
+
+from title_dictionary import title_dict_source, update_title_dictionary
+from compact_hourly import hourly_files_by_dt
+from create_features import DAILY_ROOT, DAILY_PATTERN
+from partition_manifest import (
+    load_manifest,
+    save_manifest,
+    files_by_dt,
+    fingerprint_by_dt,
+    changed_partitions,
+    drop_partitions,
+    sql_file_list,
+)
+
+# Title-clustered copies of the daily and hourly datasets for single-title
+# lookups. Rows are sorted by title_id, so parquet row-group min/max stats
+# let DuckDB skip everything but the few row groups holding one title:
+#
+#   pageviews_daily_by_title/month=M/data_0.parquet  sorted by (title_id, dt)
+#   pageviews_hourly_by_title/dt=D/data_0.parquet    sorted by (title_id, hour)
+#
+# A run only rewrites the months / days whose input partitions changed since
+# the last run (title ids are append-only, so the untouched ones stay valid).
+
+DAILY_BY_TITLE_DIR = Path("data/aggregates/pageviews_daily_by_title")
+HOURLY_BY_TITLE_DIR = Path("data/aggregates/pageviews_hourly_by_title")
+
+MANIFEST_NAME = "title_clustered_v3"  # v3: daily partitioned by month
+
+ROW_GROUP_SIZE = 65_536
+
+
+def _copy_atomic(con: duckdb.DuckDBPyConnection, select: str, out_file: Path) -> None:
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = out_file.with_suffix(".parquet.part")
+    con.execute(f"""
+        COPY ({select})
+        TO '{tmp_file.as_posix()}'
+        (FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE {ROW_GROUP_SIZE});
+    """)
+    tmp_file.replace(out_file)
+
+
+def build_title_clustered():
+    """Refresh the title-clustered copies from the days changed since the last run."""
+    update_title_dictionary()
+
+    previous = load_manifest(MANIFEST_NAME)
+    if not previous:
+        # first run, or a layout from before this manifest: start clean
+        shutil.rmtree(DAILY_BY_TITLE_DIR, ignore_errors=True)
+        shutil.rmtree(HOURLY_BY_TITLE_DIR, ignore_errors=True)
+
+    con = duckdb.connect()
+
+    daily_files = files_by_dt(DAILY_ROOT, DAILY_PATTERN)
+    daily_current = fingerprint_by_dt(daily_files)
+    changed, removed = changed_partitions(daily_current, previous.get("daily", {}))
+    months = sorted({dt[:7] for dt in changed + removed})
+
+    for month in months:
+        out_file = DAILY_BY_TITLE_DIR / f"month={month}" / "data_0.parquet"
+        files = [p for dt, paths in daily_files.items() if dt[:7] == month for p in paths]
+        if not files:
+            shutil.rmtree(out_file.parent, ignore_errors=True)
+            continue
+        _copy_atomic(con, f"""
+            SELECT title_id, dt, project, views
+            FROM read_parquet({sql_file_list(files)})
+            ORDER BY title_id, dt, project
+        """, out_file)
+    print(f"Title-clustered daily: {len(months)} month(s) rewritten, in:", DAILY_BY_TITLE_DIR)
+
+    hourly_files = hourly_files_by_dt()
+    current = fingerprint_by_dt(hourly_files)
+    changed, removed = changed_partitions(current, previous.get("hourly", {}))
+    drop_partitions(HOURLY_BY_TITLE_DIR, removed)
+
+    for dt in changed:
+        _copy_atomic(con, f"""
+            SELECT d.title_id, h.hour, h.project, h.views
+            FROM read_parquet({sql_file_list(hourly_files[dt])}, hive_partitioning = false) h
+            JOIN {title_dict_source()} d ON d.title = h.title
+            ORDER BY d.title_id, h.hour, h.project
+        """, HOURLY_BY_TITLE_DIR / f"dt={dt}" / "data_0.parquet")
+    print(f"Title-clustered hourly: {len(changed)} day(s) rewritten, "
+          f"{len(removed)} removed, in:", HOURLY_BY_TITLE_DIR)
+
+    con.close()
+    save_manifest(MANIFEST_NAME, {"daily": daily_current, "hourly": current})
@@ -0,0 +1,79 @@
+from pathlib import Path
+import duckdb
+
+from partition_manifest import (
+    load_manifest,
+    save_manifest,
+    fingerprint_by_dt,
+    changed_partitions,
+    sql_file_list,
+)
+from compact_hourly import hourly_files_by_dt
+
+# Persistent title -> int32 id dictionary shared by every dataset downstream
+# of pageviews_hourly. Ids are append-only: each update writes one new part
+# file holding only titles never seen before, so existing ids never change.
+
+TITLE_DICT_DIR = Path("data/processed/title_dict")
+TITLE_DICT_GLOB = f"{TITLE_DICT_DIR.as_posix()}/part-*.parquet"
+
+MANIFEST_NAME = "title_dict"
+
+
+def title_dict_source() -> str:
+    """SQL relation for the dictionary (title_id INTEGER, title VARCHAR)."""
+    if not any(TITLE_DICT_DIR.glob("part-*.parquet")):
+        return "(SELECT NULL::INTEGER AS title_id, NULL::VARCHAR AS title WHERE false)"
+    return f"read_parquet('{TITLE_DICT_GLOB}')"
+
+
+def _add_titles(con: duckdb.DuckDBPyConnection, source: str) -> int:
+    TITLE_DICT_DIR.mkdir(parents=True, exist_ok=True)
+    existing = sorted(TITLE_DICT_DIR.glob("part-*.parquet"))
+    out_file = TITLE_DICT_DIR / f"part-{len(existing):05d}.parquet"
+    tmp_file = out_file.with_suffix(".parquet.part")
+
+    dict_src = title_dict_source()
+    con.execute(f"""
+        COPY (
+            SELECT
+                CAST((SELECT COALESCE(MAX(title_id), -1) FROM {dict_src})
+                     + ROW_NUMBER() OVER (ORDER BY s.title) AS INTEGER) AS title_id,
+                s.title
+            FROM (SELECT DISTINCT title FROM {source} WHERE title IS NOT NULL) s
+            ANTI JOIN {dict_src} d ON d.title = s.title
+            ORDER BY title_id
+        )
+        TO '{tmp_file.as_posix()}'
+        (FORMAT PARQUET, COMPRESSION ZSTD);
+    """)
+
+    added = con.execute(f"SELECT COUNT(*) FROM read_parquet('{tmp_file.as_posix()}')").fetchone()[0]
+    if added == 0:
+        tmp_file.unlink()
+    else:
+        tmp_file.replace(out_file)
+    return added
+
+
+def register_titles(con: duckdb.DuckDBPyConnection, source: str) -> int:
+    """Give ids to titles from `source` (a relation with a `title` column)
+    that aren't in the dictionary yet, e.g. redirect targets without views."""
+    return _add_titles(con, source)
+
+
+def update_title_dictionary():
+    """Assign ids to titles from hourly partitions added or changed since the last run."""
+    hourly_files = hourly_files_by_dt()
+    current = fingerprint_by_dt(hourly_files)
+    changed, _ = changed_partitions(current, load_manifest(MANIFEST_NAME))
+    if not changed:
+        return
+
+    con = duckdb.connect()
+    source = f"read_parquet({sql_file_list([p for dt in changed for p in hourly_files[dt]])}, hive_partitioning = false)"
+    added = _add_titles(con, source)
+    con.close()
+
+    save_manifest(MANIFEST_NAME, current)
+    print(f"Title dictionary: {added:,} new title(s) from {len(changed)} day(s)")
@@ -0,0 +1,112 @@
+import duckdb
+import pandas as pd
+
+# Typeahead index for the article explorer, stored in the DuckDB catalog.
+#
+#   title_search   (title_id, title, title_key, total_views) sorted by
+#                  title_key = lower(title), so prefix lookups are a range scan
+#   title_trigrams (trigram, title_id) for every title, sorted by trigram
+#
+# Queries of 3+ characters intersect the trigram postings and then verify
+# with contains(); since every title is indexed, that is the complete set of
+# substring matches. Shorter queries have no trigram, so they use the prefix
+# range scan and only fall back to a contains() scan when it comes up short.
+
+SEARCH_LIMIT = 50
+
+# sorts after any real character, closing the prefix range scan
+_MAX_CHAR = chr(0x10FFFF)
+
+
+def build_title_search(con: duckdb.DuckDBPyConnection) -> None:
+    """Create the search tables from title_dict and pageviews_daily in `con`."""
+    con.execute("""
+        CREATE OR REPLACE TABLE title_search AS
+        SELECT
+            d.title_id,
+            d.title,
+            lower(d.title) AS title_key,
+            t.total_views
+        FROM (
+            SELECT title_id, SUM(views) AS total_views
+            FROM pageviews_daily
+            GROUP BY title_id
+        ) t
+        JOIN title_dict d USING (title_id)
+        ORDER BY title_key
+    """)
+
+    con.execute("""
+        CREATE OR REPLACE TABLE title_trigrams AS
+        SELECT DISTINCT
+            substr(title_key, i, 3) AS trigram,
+            title_id
+        FROM (
+            SELECT title_id, title_key, UNNEST(range(1, length(title_key) - 1)) AS i
+            FROM title_search
+            WHERE length(title_key) >= 3
+        )
+        ORDER BY trigram, title_id
+    """)
+
+
+def _trigrams(key: str) -> list[str]:
+    return sorted({key[i:i + 3] for i in range(len(key) - 2)})
+
+
+def lookup_titles(con: duckdb.DuckDBPyConnection, q: str, limit: int = SEARCH_LIMIT):
+    """Top `limit` titles (by total views) containing `q`, case-insensitive.
+
+    Returns a DataFrame with title_id, title, total_views.
+    """
+    key = q.strip().replace(" ", "_").lower()
+    if not key:
+        return con.execute("SELECT title_id, title, total_views FROM title_search LIMIT 0").df()
+
+    if len(key) >= 3:
+        grams = _trigrams(key)
+        return con.execute(
+            """
+            WITH hits AS (
+                SELECT title_id
+                FROM title_trigrams
+                WHERE trigram IN (SELECT * FROM UNNEST(?))
+                GROUP BY title_id
+                HAVING COUNT(*) = ?
+            )
+            SELECT s.title_id, s.title, s.total_views
+            FROM title_search s
+            JOIN hits USING (title_id)
+            WHERE contains(s.title_key, ?)
+            ORDER BY s.total_views DESC
+            LIMIT ?
+            """,
+            [grams, len(grams), key, limit],
+        ).df()
+
+    prefix = con.execute(
+        """
+        SELECT title_id, title, total_views
+        FROM title_search
+        WHERE title_key >= ?
+          AND title_key < ?
+        ORDER BY total_views DESC
+        LIMIT ?
+        """,
+        [key, key + _MAX_CHAR, limit],
+    ).df()
+    if len(prefix) >= limit:
+        return prefix
+
+    # one- or two-character keys rarely get here (most have enough prefix
+    # hits); the scan's matches include the prefix ones
+    return con.execute(
+        """
+        SELECT title_id, title, total_views
+        FROM title_search
+        WHERE contains(title_key, ?)
+        ORDER BY total_views DESC
+        LIMIT ?
+        """,
+        [key, limit],
+    ).df()
@@ -1,64 +1,139 @@
 import duckdb
-from canonicalize_topic import (
-    wikidata_search_qid,
-    wikidata_get_enwiki_title,
-    enwiki_get_redirect_titles,
-    normalize_to_dump_title,
-)
+import pandas as pd
+from api_cache import OfflineCacheMiss
+from canonicalize_topic import resolve_topics, normalize_to_dump_title
+
+# `con` is a connection to the DuckDB catalog (see catalog.py), which
+# provides the pageviews_daily_by_title view and the title_dict table. If
+# the catalog also has a redirect_map table (see redirect_map.py), redirects
+# come from it and only the Wikidata search / sitelink lookups go to the API.
+
+def _has_redirect_map(con: duckdb.DuckDBPyConnection) -> bool:
+    return con.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'redirect_map'"
+    ).fetchone()[0] > 0
+
+
+def local_redirects(con: duckdb.DuckDBPyConnection, canonical_title: str) -> list[str]:
+    rows = con.execute(
+        "SELECT redirect_title FROM redirect_map WHERE canonical_title = ?",
+        [normalize_to_dump_title(canonical_title)],
+    ).fetchall()
+    return [t for (t,) in rows]
+
+
+def build_topics_series(con: duckdb.DuckDBPyConnection, queries: list[str], projects=("en",)):
+    """Daily series for several topics from one scan.
+
+    Every topic's canonical title and redirects go into a registered table;
+    one pass over pageviews_daily_by_title hash-joins it on title_id (the
+    join's min/max filter prunes row groups of the title-sorted copy) and
+    returns per-topic series and per-title totals together via GROUPING SETS.
+
+    Returns (series, metas): series has columns topic, dt, views_topic for
+    the topics that matched; metas is {query: meta}, with an "error" key
+    for topics that could not be built.
+    """
+    queries = list(dict.fromkeys(queries))
+    local = _has_redirect_map(con)
+    try:
+        topics = resolve_topics(queries, redirects=not local)
+    except OfflineCacheMiss as e:
+        return _empty_series(), {q: {"error": str(e)} for q in queries}
+
+    metas, candidates = {}, []
+    for q in queries:
+        topic = topics[q]
+        qid, canonical = topic["qid"], topic["canonical_title"]
+        if not qid:
+            metas[q] = {"error": "No Wikidata matches"}
+            continue
+        if not canonical:
+            metas[q] = {"error": "No enwiki sitelink", "qid": qid}
+            continue
+
+        redirects = local_redirects(con, canonical) if local else topic["redirects"]
+        metas[q] = {"qid": qid, "canonical_title": canonical, "redirect_count": len(redirects)}
+        for t in dict.fromkeys(normalize_to_dump_title(t) for t in [canonical] + redirects):
+            candidates.append((q, t))
+
+    if candidates:
+        con.register("topic_titles", pd.DataFrame(candidates, columns=["topic", "title"]))
+        try:
+            rows = con.execute(
+                """
+                WITH cand AS (
+                    SELECT c.topic, d.title_id, d.title
+                    FROM topic_titles c
+                    JOIN title_dict d USING (title)
+                )
+                SELECT c.topic, c.title_id, c.title, p.dt, SUM(p.views) AS views
+                FROM pageviews_daily_by_title p
+                JOIN cand c USING (title_id)
+                WHERE p.project IN (SELECT * FROM UNNEST(?))
+                GROUP BY GROUPING SETS ((c.topic, p.dt), (c.topic, c.title_id, c.title))
+                """,
+                [list(projects)],
+            ).df()
+        finally:
+            con.unregister("topic_titles")
+    else:
+        rows = pd.DataFrame(columns=["topic", "title_id", "title", "dt", "views"])
+
+    # (topic, title) rows have no dt, (topic, dt) rows have no title
+    per_title = rows[rows["dt"].isna()].sort_values(["topic", "views"], ascending=[True, False])
+    series = (
+        rows[rows["title"].isna()][["topic", "dt", "views"]]
+        .rename(columns={"views": "views_topic"})
+        .sort_values(["topic", "dt"])
+        .reset_index(drop=True)
+    )
+
+    for q, meta in metas.items():
+        if "error" in meta:
+            continue
+        matched = per_title[per_title["topic"] == q]
+        if matched.empty:
+            meta["error"] = "Canonical + redirects not found in dataset"
+            continue
+        meta["matched_titles_count"] = len(matched)
+        meta["matched_titles_sample"] = matched["title"].tolist()[:50]
+        meta["matched_title_ids"] = matched["title_id"].astype(int).tolist()
+
+    return series, metas
+
+
+def _empty_series() -> pd.DataFrame:
+    return pd.DataFrame(columns=["topic", "dt", "views_topic"])
 
-DAILY_GLOB = "data/aggregates/pageviews_daily/**/*.parquet"
 
 def build_topic_series(con: duckdb.DuckDBPyConnection, query: str, projects=("en",)):
-    candidates = wikidata_search_qid(query, limit=5)
-    if not candidates:
-        return None, {"error": "No Wikidata matches"}
+    series, metas = build_topics_series(con, [query], projects=projects)
+    meta = metas[query]
+    if "error" in meta:
+        return None, meta
+    series = series[series["topic"] == query][["dt", "views_topic"]].reset_index(drop=True)
+    return series, meta
 
-    qid = candidates[0]["qid"]
-    canonical = wikidata_get_enwiki_title(qid)
-    if not canonical:
-        return None, {"error": "No enwiki sitelink", "qid": qid}
 
-    redirects = enwiki_get_redirect_titles(canonical)
-    titles = [canonical] + redirects
-    titles = [normalize_to_dump_title(t) for t in titles]
+def prewarm_trending_topics(con: duckdb.DuckDBPyConnection, limit: int = 50) -> int:
+    """Resolve the latest date's overall leaderboard titles into the API cache.
 
-    existing = con.execute(
-        f"""
+    Runs in one batched pass (see resolve_topics), so the topic tab answers
+    from cache for anything currently trending. Returns the number resolved.
+    """
+    titles = con.execute(
+        """
         SELECT title
-        FROM read_parquet('{DAILY_GLOB}')
-        WHERE project IN (SELECT * FROM UNNEST(?))
-          AND title IN (SELECT * FROM UNNEST(?))
+        FROM trending_top
+        WHERE dt = (SELECT MAX(dt) FROM trending_top)
+          AND project = 'all'
+          AND board = 'overall'
         GROUP BY title
+        ORDER BY MIN(rank)
+        LIMIT ?
         """,
-        [list(projects), titles],
-    ).df()
-
-    matched_titles = existing["title"].tolist()
-    if not matched_titles:
-        return None, {
-            "error": "Canonical + redirects not found in dataset",
-            "qid": qid,
-            "canonical_title": canonical,
-            "redirect_count": len(redirects),
-        }
-
-    series = con.execute(
-        f"""
-        SELECT dt, SUM(views) AS views_topic
-        FROM read_parquet('{DAILY_GLOB}')
-        WHERE project IN (SELECT * FROM UNNEST(?))
-          AND title IN (SELECT * FROM UNNEST(?))
-        GROUP BY dt
-        ORDER BY dt
-        """,
-        [list(projects), matched_titles],
-    ).df()
-
-    meta = {
-        "qid": qid,
-        "canonical_title": canonical,
-        "redirect_count": len(redirects),
-        "matched_titles_count": len(matched_titles),
-        "matched_titles_sample": matched_titles[:50],
-    }
-    return series, meta
+        [limit],
+    ).fetchall()
+    queries = [t.replace("_", " ") for (t,) in titles]
+    return len(resolve_topics(queries))